@@ -1,16 +1,37 @@
-from fastapi import FastAPI, HTTPException, Request, status
+from src.core.startup import init_duration_ms
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
 from mangum import Mangum
 from src.api.user import user_router
 from src.api.auth import auth_router
 from src.api.assets import assets_router
+from src.common.methods import OrjsonResponse
 from src.core.config import Config
+from src.core.executors import run_blocking
+from src.core.warmup import is_warmup_event, prime
 from starlette.middleware.cors import CORSMiddleware
 from src.core.logging import logger
+from src.core.middleware import OriginEnforcementMiddleware, RequestMetricsMiddleware
+from src.services.email import handle_email_event, outbox, smtp_connection
+from src.services.gallery import handle_gallery_event
+from src.services.images import handle_s3_event
+from src.services.turnstile import turnstile_verifier
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Long-lived servers prime clients and caches before taking traffic
+    await run_blocking(prime)
+    yield
+    outbox.flush(timeout=Config.EMAIL_FLUSH_TIMEOUT)
+    smtp_connection.close()
+    await turnstile_verifier.aclose()
+
 app = FastAPI(
     docs_url="/docs" if Config.APP_ENV != "PROD" else None,
-    redoc_url="/redoc" if Config.APP_ENV != "PROD" else None
+    redoc_url="/redoc" if Config.APP_ENV != "PROD" else None,
+    lifespan=lifespan,
+    default_response_class=OrjsonResponse
 )
 
 app.add_middleware(
@@ -20,25 +41,43 @@ app.add_middleware(
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],  # Allowed HTTP methods
     allow_headers=["Authorization", "Content-Type"],  # Allowed headers
 )
-# Custom middleware to enforce 'Origin' header in production
-@app.middleware("http")
-async def enforce_origin_in_production(request: Request, call_next):
-    # Check if the environment is production
-    if Config.APP_ENV == "production":
-        if "origin" not in request.headers:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Forbidden: Missing Origin header"
-            )
-    
-    # Proceed with the request
-    return await call_next(request)
+# Each add_middleware wraps the previous ones: requests pass metrics, the Origin check, then CORS
+app.add_middleware(OriginEnforcementMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
 
 app.include_router(user_router, prefix="/user", tags=["user"])
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(assets_router, prefix="/assets", tags=["assets"])
 
-handler = Mangum(app)
+# Lambda primes through warm-up events instead of the lifespan, so a cold start
+# triggered by a real request doesn't also pay for priming
+asgi_handler = Mangum(app, lifespan="off")
+
+def handler(event, context):
+    if is_warmup_event(event):
+        return { "warmed": True, "timings": prime() }
+
+    return asgi_handler(event, context)
 
 # Add logging
-handler = logger.inject_lambda_context(handler, clear_state=True)
\ No newline at end of file
+handler = logger.inject_lambda_context(handler, clear_state=True)
+
+def email_handler(event, context):
+    # SQS batches from EMAIL_QUEUE_URL -> SMTP, failed messages are redelivered
+    return handle_email_event(event)
+
+email_handler = logger.inject_lambda_context(email_handler, clear_state=True)
+
+def image_handler(event, context):
+    # S3 ObjectCreated/ObjectRemoved notifications on the asset bucket -> WebP derivatives
+    return handle_s3_event(event)
+
+image_handler = logger.inject_lambda_context(image_handler, clear_state=True)
+
+def gallery_index_handler(event, context):
+    # S3 object notifications on the asset bucket -> GALLERY_TABLE
+    return handle_gallery_event(event)
+
+gallery_index_handler = logger.inject_lambda_context(gallery_index_handler, clear_state=True)
+
+logger.info(f"Init completed in {init_duration_ms():.1f} ms")
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""
+Micro-benchmark of building JSON responses: Starlette's stdlib JSONResponse against
+custom_response / OrjsonResponse, for a fixed Constants message, a login payload and
+a gallery page of presigned URLs.
+
+    python -m benchmarks.json_responses --number 20000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+for name, value in {
+    "APP_SECRET" : "benchmark-secret",
+    "JWT_ALGO" : "HS256",
+    "JWT_EXPIRY_MIN" : "30",
+}.items():
+    os.environ.setdefault(name, value)
+
+from fastapi.responses import JSONResponse
+from src.common.constants import Constants
+from src.common.methods import OrjsonResponse, custom_response
+
+USER = {
+    "user_id" : "0b3e8b4c-6c1f-4a55-9a53-54b2d5d1c0aa",
+    "full_name" : "Benchmark User",
+    "user_name" : "benchmark",
+    "email" : "benchmark@example.com",
+    "phone_number" : "9999999999",
+    "picture" : "",
+    "user_type" : "devotee",
+    "account_type" : "internal",
+}
+
+GALLERY = {
+    "images" : [
+        f"https://bucket.s3.amazonaws.com/pictures/picture-{index}.jpg"
+        "?AWSAccessKeyId=AKIAEXAMPLE&Signature=2yXn0pIDl2V1Ad8kMm1uS0b4p2U%3D&Expires=1792355808"
+        for index in range(100)
+    ],
+    "total" : 1000,
+    "next_cursor" : "Wy0xNzkyMzU0NjEzLjAsICJwaWN0dXJlcy9wMS5qcGciXQ",
+}
+
+CASES = {
+    "static_message" : (
+        lambda: JSONResponse(content={ "message" : Constants.OTP_EXPIRED_OR_INVALID }, status_code=400),
+        lambda: custom_response(Constants.OTP_EXPIRED_OR_INVALID, 400),
+    ),
+    "login_payload" : (
+        lambda: JSONResponse(content={ "message" : Constants.LOGIN_SUCCESS, "user" : USER }, status_code=202),
+        lambda: custom_response(Constants.LOGIN_SUCCESS, 202, extra_keys={ "user" : USER }),
+    ),
+    "gallery_page" : (
+        lambda: JSONResponse(content=GALLERY),
+        lambda: OrjsonResponse(content=GALLERY),
+    ),
+}
+
+
+def measure(func, number, repeat):
+    # Best of `repeat` runs, in microseconds per response
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare stdlib and orjson response rendering")
+    parser.add_argument("--number", type=int, default=20000, help="Responses per run")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case, the best is kept")
+    args = parser.parse_args(argv)
+
+    report = {}
+    for case, (baseline, candidate) in CASES.items():
+        assert json.loads(baseline().body) == json.loads(candidate().body), case
+        baseline_us = measure(baseline, args.number, args.repeat)
+        candidate_us = measure(candidate, args.number, args.repeat)
+        report[case] = {
+            "stdlib_us" : round(baseline_us, 3),
+            "orjson_us" : round(candidate_us, 3),
+            "speedup" : round(baseline_us / candidate_us, 2),
+        }
+    sys.stdout.write(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Offline load test of the FastAPI app.
+
+DynamoDB and S3 are served in-process by moto, mail goes to a local aiosmtpd sink and
+Turnstile to a stub HTTP endpoint, so the run needs no AWS account or network access.
+Requests are driven through httpx's ASGI transport by `--concurrency` virtual users picking
+scenarios from `--mix`, and the report is written as JSON with sorted keys so two runs
+can be diffed directly.
+
+    python -m benchmarks.load_test --concurrency 16 --iterations 2000 --output bench.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCENARIOS = ("login", "otp", "profile", "assets")
+DEFAULT_MIX = "login=3,otp=1,profile=2,assets=4"
+PASSWORD = "Benchmark!1"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TurnstileStub(BaseHTTPRequestHandler):
+    """Accepts every token like Cloudflare's siteverify does for a valid one"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = b'{"success": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_turnstile_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", free_port()), TurnstileStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_smtp_sink():
+    from aiosmtpd.controller import Controller
+
+    class Sink:
+        received = 0
+
+        async def handle_DATA(self, server, session, envelope):
+            Sink.received += 1
+            return "250 OK"
+
+    controller = Controller(Sink(), hostname="127.0.0.1", port=free_port())
+    controller.start()
+    return controller
+
+
+def configure_environment(args, turnstile, smtp):
+    """Point the app at the stand-ins; must run before anything under src/ is imported"""
+    defaults = {
+        "APP_ENV" : "benchmark",
+        "APP_SECRET" : "benchmark-secret",
+        "JWT_ALGO" : "HS256",
+        "JWT_EXPIRY_MIN" : "30",
+        "AWS_S3_BUCKET_NAME" : "benchmark-assets",
+        "ALLOWED_ORIGINS" : "*",
+        "GOOGLE_CLIENT_ID" : "benchmark",
+        "USERS_TABLE" : "benchmark-users",
+        "TTL_TABLE" : "benchmark-ttl",
+        "AWS_DEFAULT_REGION" : "us-east-1",
+        "METRICS_ENABLED" : "NO",
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+    os.environ.update({
+        "AWS_ACCESS_KEY_ID" : "testing",
+        "AWS_SECRET_ACCESS_KEY" : "testing",
+        "BOT_PROTECTION" : "YES",
+        "TURNSTILE_URL" : f"http://127.0.0.1:{turnstile.server_address[1]}/siteverify",
+        "TURNSTILE_SECRET_KEY" : "benchmark",
+        "SMTP_HOST" : "127.0.0.1",
+        "SMTP_PORT" : str(smtp.port),
+        "SMTP_STARTTLS" : "NO",
+        "SENDER_EMAIL" : "benchmark@localhost",
+        "MAIL_APP_PASSWORD" : "",
+        # A single client address would otherwise be throttled after a few logins
+        "LOGIN_RATE_LIMIT" : str(10 ** 9),
+        "REGISTER_RATE_LIMIT" : str(10 ** 9),
+        "OTP_MAX_REQUESTS" : str(10 ** 9),
+    })
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+
+def seed(args):
+    """Create the tables, lookup indexes, users and gallery objects"""
+    from src.core.aws import aws
+    from src.core.config import Config
+    from src.core.security import hash_password
+    from src.db.indexes import ensure_indexes
+
+    dynamodb = aws.resource("dynamodb")
+    for table_name, key in ((Config.USERS_TABLE, "user_id"), (Config.TTL_TABLE, "id")):
+        dynamodb.create_table(
+            TableName=table_name,
+            KeySchema=[{ "AttributeName" : key, "KeyType" : "HASH" }],
+            AttributeDefinitions=[{ "AttributeName" : key, "AttributeType" : "S" }],
+            BillingMode="PAY_PER_REQUEST",
+        )
+    users_table = aws.table(Config.USERS_TABLE)
+    ensure_indexes(users_table, poll_seconds=0)
+
+    # Every user shares one password, so it is hashed once at the configured cost
+    hashed_password = hash_password(PASSWORD)
+    users = []
+    with users_table.batch_writer() as batch:
+        for index in range(args.users):
+            user = {
+                "user_id" : f"bench-user-{index}",
+                "user_name" : f"bench{index}",
+                "full_name" : f"Benchmark User {index}",
+                "email" : f"bench{index}@example.com",
+                "phone_number" : "9999999999",
+                "picture" : "",
+                "user_type" : "devotee",
+                "account_type" : "internal",
+            }
+            batch.put_item(Item=dict(user, password=hashed_password))
+            users.append(user)
+
+    s3 = aws.client("s3")
+    s3.create_bucket(Bucket=Config.AWS_S3_BUCKET_NAME)
+    for index in range(args.objects):
+        s3.put_object(Bucket=Config.AWS_S3_BUCKET_NAME, Key=f"pictures/picture-{index}.jpg", Body=b"\xff\xd8\xff")
+        s3.put_object(Bucket=Config.AWS_S3_BUCKET_NAME, Key=f"carousel/carousel-{index}.jpg", Body=b"\xff\xd8\xff")
+    return users
+
+
+class VirtualUser:
+    """One browser session: its own cookie jar and seeded user"""
+
+    def __init__(self, number, client, user, rng, samples):
+        self.number = number
+        self.client = client
+        self.user = user
+        self.rng = rng
+        self.samples = samples
+        self.otp_requests = 0
+
+    async def request(self, route, method, url, **kwargs):
+        # Unique Turnstile tokens, a replayed token is rejected like Cloudflare does
+        headers = { "Authorization" : f"turnstile-{self.number}-{self.rng.random()}" }
+        started = time.perf_counter()
+        response = await self.client.request(method, url, headers=headers, **kwargs)
+        self.samples.append((route, response.status_code, (time.perf_counter() - started) * 1000))
+        return response
+
+    async def login(self):
+        credentials = { "user_name" : self.user["user_name"], "password" : PASSWORD, "user_type" : "devotee" }
+        return await self.request("POST /auth/login", "POST", "/auth/login", json=credentials)
+
+    async def otp(self):
+        from src.core.aws import aws
+        from src.core.config import Config
+
+        self.otp_requests += 1
+        email = f"otp-{self.number}-{self.otp_requests}@example.com"
+        await self.request("POST /auth/otp_request", "POST", "/auth/otp_request", json={ "email" : email })
+        # The mail is only sunk, read the OTP back from the TTL table instead
+        record = aws.table(Config.TTL_TABLE).get_item(Key={ "id" : email }).get("Item", {})
+        await self.request("POST /auth/otp_verify", "POST", "/auth/otp_verify", json={ "email" : email, "otp" : record.get("new_data", "0000") })
+        # That signed in as the OTP user, the next profile scenario logs back in as our own
+        self.client.cookies.clear()
+
+    async def profile(self):
+        if "access_token" not in self.client.cookies:
+            await self.login()
+        profile = dict(self.user, full_name=f"Benchmark User {self.number} {self.rng.randrange(1000)}")
+        await self.request("PUT /user/profile", "PUT", "/user/profile", json=profile)
+
+    async def assets(self):
+        if self.rng.random() < 0.5:
+            await self.request("GET /assets/carousel", "GET", "/assets/carousel")
+            return
+        response = await self.request("GET /assets/picture_gallery", "GET", "/assets/picture_gallery", params={ "size" : 20 })
+        next_cursor = response.json().get("next_cursor") if response.status_code == 200 else None
+        if next_cursor:
+            await self.request("GET /assets/picture_gallery", "GET", "/assets/picture_gallery", params={ "size" : 20, "cursor" : next_cursor })
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name!r}, expected one of {', '.join(SCENARIOS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    routes = {}
+    for route, status_code, latency in samples:
+        routes.setdefault(route, []).append((status_code, latency))
+
+    def stats(entries):
+        latencies = sorted(latency for _, latency in entries)
+        statuses = {}
+        for status_code, _ in entries:
+            statuses[str(status_code)] = statuses.get(str(status_code), 0) + 1
+        return {
+            "requests" : len(entries),
+            "rps" : round(len(entries) / elapsed, 2),
+            "p50_ms" : round(percentile(latencies, 0.50), 2),
+            "p95_ms" : round(percentile(latencies, 0.95), 2),
+            "p99_ms" : round(percentile(latencies, 0.99), 2),
+            "max_ms" : round(latencies[-1], 2),
+            "errors" : sum(count for status_code, count in statuses.items() if status_code.startswith("5")),
+            "status" : statuses,
+        }
+
+    return {
+        "routes" : { route : stats(entries) for route, entries in routes.items() },
+        "total" : stats([(status_code, latency) for _, status_code, latency in samples]),
+        "elapsed_s" : round(elapsed, 2),
+    }
+
+
+async def drive(app, users, args):
+    import httpx
+
+    weights = parse_mix(args.mix)
+    scenarios, scenario_weights = list(weights), list(weights.values())
+    samples = []
+    remaining = iter(range(args.iterations))
+
+    async def virtual_user(number):
+        rng = random.Random(args.seed + number)
+        transport = httpx.ASGITransport(app=app, client=(f"10.0.0.{number % 250 + 1}", 50000))
+        async with httpx.AsyncClient(transport=transport, base_url="https://benchmark") as client:
+            session = VirtualUser(number, client, users[number % len(users)], rng, samples)
+            for _ in remaining:
+                await getattr(session, rng.choices(scenarios, scenario_weights)[0])()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(number) for number in range(args.concurrency)))
+    return samples, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test of the API against local stand-ins")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=500, help="Scenarios to run across all users")
+    parser.add_argument("--warmup", type=int, default=20, help="Scenarios run before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Scenario weights, default {DEFAULT_MIX}")
+    parser.add_argument("--users", type=int, default=50, help="Seeded users")
+    parser.add_argument("--objects", type=int, default=200, help="Seeded pictures and carousel objects")
+    parser.add_argument("--bcrypt-rounds", type=int, help="Override BCRYPT_ROUNDS for the run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="File for the JSON report, stdout when omitted")
+    args = parser.parse_args(argv)
+    parse_mix(args.mix)
+
+    turnstile = start_turnstile_stub()
+    smtp = start_smtp_sink()
+    configure_environment(args, turnstile, smtp)
+
+    from moto import mock_aws
+    # Keep stray prints from the app out of a report written to stdout
+    quiet = contextlib.redirect_stdout(sys.stderr) if not args.output else contextlib.nullcontext()
+    with mock_aws(), quiet:
+        users = seed(args)
+        from app import app
+        from src.services.email import outbox, smtp_connection
+
+        warmup = argparse.Namespace(**dict(vars(args), iterations=args.warmup, seed=args.seed - 1))
+        asyncio.run(drive(app, users, warmup))
+        samples, elapsed = asyncio.run(drive(app, users, args))
+        outbox.flush(timeout=30)
+        smtp_connection.close()
+
+    report = summarize(samples, elapsed)
+    report["config"] = {
+        "concurrency" : args.concurrency,
+        "iterations" : args.iterations,
+        "mix" : parse_mix(args.mix),
+        "users" : args.users,
+        "objects" : args.objects,
+        "bcrypt_rounds" : int(os.environ.get("BCRYPT_ROUNDS", 12)),
+        "seed" : args.seed,
+    }
+    output = json.dumps(report, indent=2, sort_keys=True) + "\n"
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        sys.stdout.write(output)
+
+    turnstile.shutdown()
+    smtp.stop()
+
+
+if __name__ == "__main__":
+    main()
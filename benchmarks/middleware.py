@@ -0,0 +1,115 @@
+"""
+Micro-benchmark of the per-request cost of the middleware stack: the origin check and
+request metrics written as @app.middleware("http") functions (BaseHTTPMiddleware) against
+the raw ASGI classes in src/core/middleware.py, each around a trivial route. Requests are
+fed straight to the ASGI app, so no transport or server overhead is measured.
+
+    python -m benchmarks.middleware --requests 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+for name, value in {
+    "APP_SECRET" : "benchmark-secret",
+    "JWT_ALGO" : "HS256",
+    "JWT_EXPIRY_MIN" : "30",
+    "METRICS_ENABLED" : "NO",
+}.items():
+    os.environ.setdefault(name, value)
+
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import Response
+from src.core.metrics import end_request, publish_request, route_label, start_request
+from src.core.middleware import OriginEnforcementMiddleware, RequestMetricsMiddleware
+
+
+def build_app(stack):
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return Response(b"pong")
+
+    if stack == "base_http":
+        # The app.py middleware before the move to raw ASGI
+        @app.middleware("http")
+        async def enforce_origin_in_production(request: Request, call_next):
+            if "origin" not in request.headers:
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden: Missing Origin header")
+            return await call_next(request)
+
+        @app.middleware("http")
+        async def instrument_requests(request: Request, call_next):
+            timings, token = start_request()
+            status_code = 500
+            try:
+                response = await call_next(request)
+                status_code = response.status_code
+                response.headers["Server-Timing"] = timings.server_timing()
+                return response
+            finally:
+                end_request(token)
+                publish_request(timings, route_label(request.scope), request.method, status_code)
+    elif stack == "asgi":
+        app.add_middleware(OriginEnforcementMiddleware, enabled=True)
+        app.add_middleware(RequestMetricsMiddleware, server_timing=True)
+    return app
+
+
+async def run(app, requests):
+    scope = {
+        "type" : "http",
+        "asgi" : { "version" : "3.0" },
+        "http_version" : "1.1",
+        "method" : "GET",
+        "scheme" : "https",
+        "path" : "/ping",
+        "raw_path" : b"/ping",
+        "root_path" : "",
+        "query_string" : b"",
+        "headers" : [(b"host", b"benchmark"), (b"origin", b"https://benchmark")],
+        "client" : ("127.0.0.1", 50000),
+        "server" : ("benchmark", 443),
+    }
+
+    async def receive():
+        return { "type" : "http.request", "body" : b"", "more_body" : False }
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message
+
+    # Builds the middleware stack on the first call
+    await app(dict(scope), receive, send)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare BaseHTTPMiddleware and raw ASGI middleware overhead")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stack, the best is kept")
+    args = parser.parse_args(argv)
+
+    per_request = {}
+    for stack in ("none", "base_http", "asgi"):
+        app = build_app(stack)
+        per_request[stack] = min(asyncio.run(run(app, args.requests)) for _ in range(args.repeat))
+
+    report = {
+        "per_request_us" : { stack : round(value, 2) for stack, value in per_request.items() },
+        "middleware_overhead_us" : {
+            stack : round(per_request[stack] - per_request["none"], 2) for stack in ("base_http", "asgi")
+        },
+    }
+    sys.stdout.write(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,97 +1,143 @@
-from fastapi import APIRouter, Depends, status
+import contextvars
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Request, status
 
+from src.common.constants import Constants
 from src.common.dependencies import get_s3_client
-from src.common.methods import internal_server_error
+from src.common.methods import conditional_response, custom_response, internal_server_error
 from src.core.config import Config
 from botocore.exceptions import ClientError
+from src.core.executors import s3_executor
 from src.core.logging import logger
+from src.core.metrics import timed
+from src.services.assets import InvalidCursor, get_manifest, presigned_urls
+from src.services.gallery import get_gallery_index
+from src.services.images import derived_key, image_metadata
 
 
 assets_router = APIRouter()
 
+ASSETS_CACHE_CONTROL = f"public, max-age={Config.ASSETS_CACHE_MAX_AGE}, stale-while-revalidate={Config.ASSETS_STALE_WHILE_REVALIDATE}"
+
+def newest_issue_time(issue_times):
+    issued_at = max(issue_times, default=None)
+    return datetime.fromtimestamp(issued_at, timezone.utc) if issued_at else None
+
+def sign_keys(s3, bucket_name, keys):
+    """Presigned URLs for `keys` plus the newest issue time, which bounds when the body last changed"""
+    with timed("s3"):
+        signed = [presigned_urls.get_with_issue_time(s3, bucket_name, key) for key in keys]
+    return [url for url, _ in signed], newest_issue_time(issued for _, issued in signed)
+
+def list_album(s3, bucket_name, prefix, cursor=None, size=None):
+    """
+    Newest-first page of an asset folder: (keys, metadata per key, total, next_cursor, last_modified).
+    Served by a Query on the gallery index when GALLERY_TABLE is set, else by the in-process S3 listing.
+    Raises InvalidCursor for tokens the source did not produce.
+    """
+    gallery_index = get_gallery_index()
+    if gallery_index is not None:
+        album = prefix.rstrip("/")
+        items, next_cursor = gallery_index.page(album, cursor, size)
+        total, updated_at = gallery_index.summary(album)
+        return [item["object_key"] for item in items], items, total, next_cursor, updated_at
+
+    # Newest-first listing of the folder, re-listed once its TTL passed
+    manifest = get_manifest(bucket_name, prefix)
+    manifest.ensure_fresh(s3)
+    keys, next_cursor = manifest.page(cursor, size)
+    # Each read runs in a copy of the request's context, so its S3 time lands in the request's timings
+    futures = [
+        s3_executor.submit(contextvars.copy_context().run, image_metadata.get, s3, bucket_name, key, manifest.etag(key))
+        for key in keys
+    ]
+    return keys, [future.result() for future in futures], manifest.total, next_cursor, manifest.last_modified
+
+def describe_images(s3, bucket_name, keys, signed_urls, metadata):
+    """
+    Per image: the original's URL plus, once the derivative pipeline has processed it, its
+    dimensions, a LQIP placeholder and the WebP variants so clients download only what they render.
+    Returns (items, newest issue time of the variant URLs).
+    """
+    items = []
+    issue_times = []
+
+    def sign_variant(key, variant):
+        url, issued_at = presigned_urls.get_with_issue_time(s3, bucket_name, derived_key(key, variant["file"]))
+        issue_times.append(issued_at)
+        return url
+
+    for key, url, meta in zip(keys, signed_urls, metadata):
+        meta = meta or {}
+        items.append({
+            "url": url,
+            "width": meta.get("width"),
+            "height": meta.get("height"),
+            "caption": meta.get("caption"),
+            "placeholder": meta.get("placeholder"),
+            "variants": [
+                {
+                    "name": variant["name"],
+                    "url": sign_variant(key, variant),
+                    "width": variant["width"],
+                    "height": variant["height"]
+                }
+                for variant in meta.get("variants", [])
+            ]
+        })
+    return items, newest_issue_time(issue_times)
+
+def last_modified_of(*timestamps):
+    return max((timestamp for timestamp in timestamps if timestamp), default=None)
+
 @assets_router.get("/picture_gallery", status_code=status.HTTP_200_OK)
-def get_picture_gallery(page: int = 1, size: int = 20, s3=Depends(get_s3_client)):
+def get_picture_gallery(request: Request, cursor: Optional[str] = None, size: int = Query(20, ge=1, le=100), s3=Depends(get_s3_client)):
     try:
         bucket_name = Config.AWS_S3_BUCKET_NAME
-        folder_prefix = "pictures/"
-        limit_per_page = size  # Use the provided size for pagination
-        
-        # Calculate the starting index for pagination
-        start_index = (page - 1) * limit_per_page
-
-        # Get all S3 folder items data
-        response = s3.list_objects_v2(Bucket=bucket_name, Prefix=folder_prefix)
-
-        if "Contents" not in response:
-            return {"images": [], "total": 0, "total_pages": 0, "next_page": None}
-
-        # Get all objects excluding the first one if it is metadata
-        image_objects = response["Contents"]
-        image_objects.pop(0)  # Remove metadata object if needed
-
-        # Sort objects by `LastModified` in descending order (newest first)
-        sorted_objects = sorted(image_objects, key=lambda obj: obj["LastModified"], reverse=True)
-
-        # Extract keys for pagination
-        total_images = len(sorted_objects)
-        total_pages = (total_images + limit_per_page - 1) // limit_per_page  # Calculate total pages
-        paginated_objects = sorted_objects[start_index:start_index + limit_per_page]
-
-        # Generate presigned URLs for paginated objects
-        signed_urls = [
-            s3.generate_presigned_url(
-                "get_object",
-                Params={"Bucket": bucket_name, "Key": obj["Key"]},
-                ExpiresIn=1200
-            )
-            for obj in paginated_objects
-        ]
-
-        # Check if there is a next page
-        next_page = page + 1 if page < total_pages else None
-
-        return {
+
+        try:
+            page_keys, metadata, total, next_cursor, last_modified = list_album(s3, bucket_name, "pictures/", cursor, size)
+        except InvalidCursor:
+            return custom_response(Constants.INVALID_CURSOR, status.HTTP_400_BAD_REQUEST)
+
+        # Presigned URLs are reused until shortly before they expire
+        signed_urls, urls_issued_at = sign_keys(s3, bucket_name, page_keys)
+        items, variants_issued_at = describe_images(s3, bucket_name, page_keys, signed_urls, metadata)
+
+        content = {
             "images": signed_urls,
-            "total": total_images,
-            "total_pages": total_pages,
-            "next_page": next_page
+            "items": items,
+            "total": total,
+            "next_cursor": next_cursor
         }
+        return conditional_response(
+            request, content,
+            last_modified=last_modified_of(last_modified, urls_issued_at, variants_issued_at),
+            cache_control=ASSETS_CACHE_CONTROL
+        )
 
     except ClientError as e:
         logger.info(f"An error occurred: {e}")
         return internal_server_error()
     
 @assets_router.get("/carousel", status_code=status.HTTP_200_OK)
-def get_carousel(s3=Depends(get_s3_client)):
+def get_carousel(request: Request, s3=Depends(get_s3_client)):
     try:
         bucket_name = Config.AWS_S3_BUCKET_NAME
-        folder_prefix = "carousel/"
-        
-        response = s3.list_objects_v2(Bucket=bucket_name, Prefix=folder_prefix)
 
-        # Check if there are objects in the folder
-        if "Contents" not in response:
-            return {"images": []}
+        keys, metadata, _, _, last_modified = list_album(s3, bucket_name, "carousel/")
 
-        # Get all objects excluding the first one if it is metadata
-        image_objects = response["Contents"]
-        image_objects.pop(0)  # Remove metadata object if needed
+        # Presigned URLs are reused until shortly before they expire
+        signed_urls, urls_issued_at = sign_keys(s3, bucket_name, keys)
+        items, variants_issued_at = describe_images(s3, bucket_name, keys, signed_urls, metadata)
 
-        # Sort objects by `LastModified` in descending order (newest first)
-        sorted_objects = sorted(image_objects, key=lambda obj: obj["LastModified"], reverse=True)
-
-        # Generate signed URLs for the sorted objects
-        signed_urls = [
-            s3.generate_presigned_url(
-                "get_object",
-                Params={"Bucket": bucket_name, "Key": obj["Key"]},
-                ExpiresIn=1200
-            )
-            for obj in sorted_objects
-        ]
-
-        return {"images": signed_urls}
+        return conditional_response(
+            request, {"images": signed_urls, "items": items},
+            last_modified=last_modified_of(last_modified, urls_issued_at, variants_issued_at),
+            cache_control=ASSETS_CACHE_CONTROL
+        )
 
     except ClientError as e:
         logger.info(f"An error occurred: {e}")
-        return internal_server_error()
\ No newline at end of file
+        return internal_server_error()
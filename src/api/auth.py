@@ -1,3 +1,4 @@
+import asyncio
 import time
 from fastapi import (
     APIRouter,
@@ -10,40 +11,58 @@ from src.common.dependencies import get_temp_table, get_user_table
 from src.common.enums import UserAccountType, UserType
 from src.common.methods import custom_response, internal_server_error
 from src.common.templates import get_otp_template
+from src.core.config import Config
+from src.core.executors import run_blocking
 from src.core.security import generate_otp
 from src.db.models import UserTable
 from src.schemas.auth import GoogleUserToken
 from src.schemas.user import OtpDetails, OtpUser, UserCredentials
 from src.services.auth import (
-    add_record_with_ttl,
     bot_protection,
     create_token,
-    get_existing_data_by_id,
+    get_existing_data_by_id_async,
+    issue_otp_async,
     response_with_extra_data,
-    update_record_with_ttl,
     verify_google_token
 )
-from src.services.email import send_email
+from src.services.email import queue_email
+from src.services.rate_limit import RateLimiter, client_ip, rate_limit, too_many_requests
 from src.services.user import (
-    create_new_user,
-    get_user_data_by_user_id,
-    get_user_data_by_user_name,
-    verify_user
+    create_new_user_async,
+    get_user_data_by_email_async,
+    get_user_data_by_user_id_async,
+    get_user_data_by_user_name_async,
+    verify_user_async
 )
 from src.core.logging import logger
 
 auth_router = APIRouter()
 
-@auth_router.post("/login", status_code=status.HTTP_201_CREATED)
+login_rate_limit = rate_limit("login", Config.LOGIN_RATE_LIMIT)
+# Keyed by account and IP, so nobody can lock an account out from their own address; the
+# much higher per account cap only bounds guessing spread over many addresses
+user_name_login_limiter = RateLimiter("login_user_name_ip", Config.LOGIN_RATE_LIMIT)
+account_login_limiter = RateLimiter("login_account", Config.LOGIN_ACCOUNT_RATE_LIMIT)
+
+@auth_router.post("/login", status_code=status.HTTP_201_CREATED, dependencies=[Depends(login_rate_limit)])
 @bot_protection
-async def login(request : Request, user_credentials : UserCredentials, users_table = Depends(get_user_table) ):
+async def login(request : Request, user_credentials : UserCredentials, users_table = Depends(get_user_table), temp_ttl_table = Depends(get_temp_table)):
+    # Per account limits on top of the per IP one, before any lookup or bcrypt work; answered
+    # like the per IP dependency's 429
+    user_name = user_credentials.user_name
+    allowed = await asyncio.gather(
+        user_name_login_limiter.hit(f"{user_name}#{client_ip(request)}", temp_ttl_table),
+        account_login_limiter.hit(user_name, temp_ttl_table)
+    )
+    if not all(allowed):
+        raise too_many_requests()
+
     try:
-        user_data = get_user_data_by_user_name(user_credentials.user_name, users_table)
-        print(user_data)
+        user_data = await get_user_data_by_user_name_async(user_credentials.user_name, users_table)
         if not user_data:
             return custom_response(Constants.REGISTER_FIRST, status.HTTP_400_BAD_REQUEST)
             
-        success = verify_user(user_credentials, user_data)
+        success = await verify_user_async(user_credentials, user_data, users_table)
         if not success:
             return custom_response(Constants.INVALID_USERNAME_AND_PASSWORD, status.HTTP_400_BAD_REQUEST)
 
@@ -51,7 +70,7 @@ async def login(request : Request, user_credentials : UserCredentials, users_tab
                 "user_id" : user_data["user_id"],
                 "full_name" : user_data["full_name"],
                 "user_name" : user_data["user_name"],
-                "email" : user_data["email"],
+                "email" : user_data.get("email", ""),
                 "phone_number" : user_data["phone_number"],
                 "picture" : user_data["picture"],
                 "user_type" : user_data["user_type"],
@@ -66,19 +85,20 @@ async def login(request : Request, user_credentials : UserCredentials, users_tab
         logger.info(f"Error: {str(e)}")
         return internal_server_error()
         
-@auth_router.post("/google_login", status_code=status.HTTP_202_ACCEPTED)
+@auth_router.post("/google_login", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(rate_limit("google_login", Config.GOOGLE_LOGIN_RATE_LIMIT))])
 async def google_login(request : Request, token : GoogleUserToken, users_table = Depends(get_user_table)):
     try : 
-        google_user_data = verify_google_token(token.token)
+        # Certificates are cached, but a refresh is a blocking HTTPS call
+        google_user_data = await run_blocking(verify_google_token, token.token)
         if not google_user_data:
             return custom_response(Constants.INVALID_TOKEN, status.HTTP_401_UNAUTHORIZED)
         
         if not google_user_data["email_verified"] and not google_user_data["sub"]:
             return custom_response(Constants.NOT_GOOGLE_VERIFIED_USER, status.HTTP_401_UNAUTHORIZED)
         
-        user_data = get_user_data_by_user_id(google_user_data["sub"], users_table)
+        user_data = await get_user_data_by_user_id_async(google_user_data["sub"], users_table)
         if not user_data:
-            success = create_new_user(
+            success = await create_new_user_async(
                 new_user = UserTable(
                     user_id = google_user_data["sub"],
                     full_name = google_user_data["name"],
@@ -123,32 +143,16 @@ async def google_login(request : Request, token : GoogleUserToken, users_table =
 @bot_protection
 async def otp_login(request : Request, user_details: OtpUser, temp_ttl_table=Depends(get_temp_table)):
     try:
-        existing_otp_record = get_existing_data_by_id(user_details.email, temp_ttl_table)
         otp = str(generate_otp())
-        
-        # Check for too many OTP requests
-        if existing_otp_record and int(existing_otp_record["request_count"]) > 3:
-            return custom_response(Constants.MANY_OTP_REQUESTS, status.HTTP_400_BAD_REQUEST)
-        
-        # Prepare record for updating or adding
-        record = {
-            "id": user_details.email,
-            "new_data": otp,
-            "request_count": existing_otp_record["request_count"] + 1 if existing_otp_record else 1,
-        }
-        if existing_otp_record:
-            record["old_data"] = existing_otp_record["new_data"]
 
-        # Save record with TTL
-        success = update_record_with_ttl(record, ttl_seconds=600, table=temp_ttl_table) if existing_otp_record \
-            else add_record_with_ttl(record, ttl_seconds=600, table=temp_ttl_table)
-
-        if not success:
-            return internal_server_error()
+        # Rotate the OTP and count the request in one atomic write
+        record = await issue_otp_async(user_details.email, otp, Config.OTP_TTL_SECONDS, Config.OTP_MAX_REQUESTS, temp_ttl_table)
+        if not record:
+            return custom_response(Constants.MANY_OTP_REQUESTS, status.HTTP_400_BAD_REQUEST)
 
-        # Send OTP email
+        # Queue the OTP email, a failed hand-over is reported instead of claiming it was sent
         email_body = get_otp_template(user_details.email, otp)
-        if not send_email(user_details.email, Constants.OTP_SUBJECT, email_body):
+        if not await queue_email(user_details.email, Constants.OTP_SUBJECT, email_body):
             return internal_server_error()
 
         return custom_response(Constants.EMAIL_SENT, status.HTTP_201_CREATED)
@@ -161,7 +165,11 @@ async def otp_login(request : Request, user_details: OtpUser, temp_ttl_table=Dep
 @bot_protection
 async def otp_verify(request : Request, otp_details: OtpDetails, temp_ttl_table = Depends(get_temp_table), users_table = Depends(get_user_table)):
     try:
-        existing_otp_record = get_existing_data_by_id(otp_details.email, temp_ttl_table)
+        # The user lookup doesn't depend on the OTP record, so both reads run concurrently
+        existing_otp_record, existing_user = await asyncio.gather(
+            get_existing_data_by_id_async(otp_details.email, temp_ttl_table),
+            get_user_data_by_email_async(otp_details.email, users_table)
+        )
         if not existing_otp_record:
             return custom_response(Constants.PLEASE_REQUEST_FIRST, status.HTTP_400_BAD_REQUEST)
         
@@ -171,11 +179,9 @@ async def otp_verify(request : Request, otp_details: OtpDetails, temp_ttl_table
         if existing_otp_record["new_data"] != otp_details.otp and existing_otp_record.get("old_data") != otp_details.otp:
             return custom_response(Constants.OTP_EXPIRED_OR_INVALID, status.HTTP_400_BAD_REQUEST)
         
-        existing_user = get_user_data_by_user_name(otp_details.email, users_table)
         if existing_user:
             del existing_user["password"]
             extra_data = { "user": existing_user }
-            print(existing_user,"sldfjdslf")
             tokens = create_token(existing_user, access_token=True, refresh_token=True)
             return response_with_extra_data(Constants.LOGIN_SUCCESS,extra_data, tokens,status.HTTP_202_ACCEPTED)
         new_user = UserTable(
@@ -184,12 +190,12 @@ async def otp_verify(request : Request, otp_details: OtpDetails, temp_ttl_table
             user_type = UserType.DEVOTEE.value,
             account_type = UserAccountType.OTP.value
         )
-        success = create_new_user(new_user, users_table)
+        success = await create_new_user_async(new_user, users_table)
         if not success:
             return internal_server_error()
-        extra_data = { "user": new_user.model_dump(exclude={"password"}) }
-        print(extra_data)
-        tokens = create_token(new_user, access_token=True, refresh_token=True)
+        user = new_user.model_dump(mode="json", exclude={"password"})
+        extra_data = { "user": user }
+        tokens = create_token(user, access_token=True, refresh_token=True)
         return response_with_extra_data( Constants.LOGIN_SUCCESS, extra_data, tokens, status.HTTP_202_ACCEPTED )
     
     except Exception as e:
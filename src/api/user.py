@@ -1,32 +1,39 @@
-from fastapi import APIRouter, HTTPException, Request, status, Depends
+from fastapi import APIRouter, HTTPException, Query, Request, status, Depends
+from fastapi.responses import StreamingResponse
 from src.common.constants import Constants
 from src.common.dependencies import get_user_table
 from src.common.enums import UserType
 from src.common.methods import custom_response, internal_server_error
+from src.core.config import Config
+from src.core.security import hash_password_async
 from src.db.models import UserTable
-from src.schemas.user import RegisterUser, UserProfile
-from src.services.auth import bot_protection, response_with_extra_data, user_access, verify_jwt
+from src.schemas.user import RegisterUser, UserIds, UserProfile
+from src.services.auth import bot_protection, ensure_claims_match, require_user, response_with_extra_data
 from src.services.user import (
-    create_new_user,
-    get_user_data_by_user_id, 
-    get_user_data_by_user_name,
-    update_user_profile
+    create_new_user_async,
+    get_user_data_by_user_id_async,
+    get_user_data_by_user_name_async,
+    get_users_by_ids_async,
+    update_user_profile_async
 )
+from src.services.export import EXPORT_FORMATS, export_users
+from src.services.rate_limit import rate_limit
 from src.core.logging import logger
 
 user_router = APIRouter()
 
 
-@user_router.post("/register", status_code = status.HTTP_201_CREATED)
+@user_router.post("/register", status_code = status.HTTP_201_CREATED, dependencies=[Depends(rate_limit("register", Config.REGISTER_RATE_LIMIT))])
 @bot_protection
 async def read_item(request : Request, user_details : RegisterUser, users_table = Depends(get_user_table) ):
     try:
-        user_data = get_user_data_by_user_name(user_details.user_name, users_table)
+        user_data = await get_user_data_by_user_name_async(user_details.user_name, users_table)
         if user_data:
             return custom_response(message = Constants.USERNAME_NOT_AVAILABLE,status_code = status.HTTP_400_BAD_REQUEST)
         
-        new_user = UserTable(**user_details.model_dump())
-        success = create_new_user(new_user, users_table)
+        hashed_password = await hash_password_async(user_details.password)
+        new_user = UserTable(**user_details.model_dump(exclude={"password"}), password=hashed_password)
+        success = await create_new_user_async(new_user, users_table)
         
         if not success:
             logger.info("Error: while creating new user in dynamoDB")
@@ -42,16 +49,16 @@ async def read_item(request : Request, user_details : RegisterUser, users_table
         return internal_server_error()
 
 @user_router.put("/profile", status_code = status.HTTP_201_CREATED)
-@user_access(allowed_user_type = UserType.DEVOTEE.value)
-@verify_jwt
 @bot_protection
-async def update_profile(request : Request, user_profile_details : UserProfile, users_table = Depends(get_user_table)):
+async def update_profile(request : Request, user_profile_details : UserProfile, users_table = Depends(get_user_table), claims = Depends(require_user(UserType.DEVOTEE))):
+    # The body is parsed and validated once by FastAPI, the ownership check reuses the model
+    ensure_claims_match(claims, user_profile_details.user_id, user_profile_details.user_type)
     try:
-        user_data = get_user_data_by_user_id(user_profile_details.user_id, users_table)
+        user_data = await get_user_data_by_user_id_async(user_profile_details.user_id, users_table)
         if not user_data:
             return custom_response(message = Constants.USER_NOT_FOUND, status_code = status.HTTP_400_BAD_REQUEST)
         
-        success = update_user_profile(user_profile_details, users_table)
+        success = await update_user_profile_async(user_profile_details, users_table)
         if not success:
             return internal_server_error()
         
@@ -59,4 +66,23 @@ async def update_profile(request : Request, user_profile_details : UserProfile,
         return response_with_extra_data(Constants.USER_PROFILE_UPDATED,extra_data)
     except Exception as e:
         logger.info(f"Error: {str(e)}")
-        return internal_server_error()
\ No newline at end of file
+        return internal_server_error()
+
+@user_router.post("/batch", status_code = status.HTTP_200_OK)
+async def get_users_in_batch(request : Request, user_ids : UserIds, users_table = Depends(get_user_table), claims = Depends(require_user(UserType.MEMBER))):
+    users = await get_users_by_ids_async(user_ids.user_ids, users_table)
+    return { "users": users }
+
+@user_router.get("/export", status_code = status.HTTP_200_OK)
+async def export_user_table(
+    request : Request,
+    export_format : str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    segments : int = Query(Config.EXPORT_SEGMENTS, ge=1, le=32),
+    users_table = Depends(get_user_table),
+    claims = Depends(require_user(UserType.MEMBER))
+):
+    return StreamingResponse(
+        export_users(users_table, export_format, segments),
+        media_type = EXPORT_FORMATS[export_format],
+        headers = { "Content-Disposition" : f'attachment; filename="users.{export_format}"' }
+    )
@@ -22,3 +22,5 @@ class Constants():
     USER_NOT_FOUND = "User not found"
     USER_PROFILE_UPDATED = "User profile is successfully updated"
     LOGOUT_SUCCESS="Logout success"
+    INVALID_CURSOR = "Invalid pagination cursor"
+    TOO_MANY_REQUESTS = "Too many requests, please try after some time"
@@ -1,15 +1,13 @@
-from fastapi import Depends
-import boto3
+from src.core.aws import aws
 from src.core.config import Config
 
-def get_db():
-    return boto3.resource('dynamodb')
+# async so FastAPI resolves them on the event loop: the table handles are shared, process-wide
+# objects and nothing blocking or per request is built here
+async def get_user_table():
+    return aws.table(Config.USERS_TABLE)
 
-def get_user_table(db =  Depends(get_db)):
-    return db.Table(Config.USERS_TABLE)
-
-def get_temp_table(db =  Depends(get_db)):
-    return db.Table(Config.TTL_TABLE)
+async def get_temp_table():
+    return aws.table(Config.TTL_TABLE)
 
 def get_s3_client():
-    return boto3.client('s3')
\ No newline at end of file
+    return aws.client('s3')
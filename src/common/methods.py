@@ -1,20 +1,80 @@
-from fastapi import status, HTTPException
-from fastapi.responses import JSONResponse
+from decimal import Decimal
+from email.utils import format_datetime, parsedate_to_datetime
+import hashlib
+import orjson
+from fastapi import Request, status, HTTPException
+from fastapi.responses import JSONResponse, Response
 from src.common.constants import Constants
 
-def custom_response(message, status_code=None, extra_keys=None):
-    content = {"message": message}
+def json_default(value):
+    """Types orjson doesn't serialize natively: pydantic models, DynamoDB numbers and sets"""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dump_json(content) -> bytes:
+    return orjson.dumps(content, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+
+class OrjsonResponse(JSONResponse):
+    """JSON response rendered by orjson straight to bytes; bytes content is sent as already encoded JSON"""
 
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dump_json(content)
+
+# {"message": ...} bodies of the fixed Constants messages, encoded once at import
+STATIC_MESSAGE_BODIES = {
+    message : dump_json({"message": message})
+    for name, message in vars(Constants).items()
+    if not name.startswith("_") and isinstance(message, str)
+}
+
+def custom_response(message, status_code=None, extra_keys=None):
     if extra_keys:
-        content.update(extra_keys)
+        content = {"message": message, **extra_keys}
+    else:
+        content = STATIC_MESSAGE_BODIES.get(message) or dump_json({"message": message})
 
     if status_code:
-        return JSONResponse(content=content, status_code=status_code)
+        return OrjsonResponse(content=content, status_code=status_code)
     else:
-        return JSONResponse(content=content)
+        return OrjsonResponse(content=content)
     
 def internal_server_error(detail=Constants.INTERNAL_SERVER_ERROR, status_code = status.HTTP_500_INTERNAL_SERVER_ERROR):
     raise HTTPException(
         detail = detail,
         status_code = status_code
-    )
\ No newline at end of file
+    )
+
+def conditional_response(request : Request, content, last_modified=None, cache_control=None):
+    """
+    JSON response carrying a strong ETag (hash of the body) and Last-Modified.
+    Answers 304 Not Modified when If-None-Match, or failing that If-Modified-Since, still matches.
+    """
+    body = dump_json(content)
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+    headers = { "ETag" : etag }
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified.replace(microsecond=0), usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        client_etags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in client_etags or "*" in client_etags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    elif last_modified and request.headers.get("if-modified-since"):
+        try:
+            if last_modified.replace(microsecond=0) <= parsedate_to_datetime(request.headers["if-modified-since"]):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,151 @@
+import threading
+from src.core.config import Config
+
+
+def default_boto_config():
+    # boto3/botocore are imported on first use to keep them out of the cold start
+    from botocore.config import Config as BotoConfig
+    return BotoConfig(
+        max_pool_connections = Config.AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout = Config.AWS_CONNECT_TIMEOUT,
+        read_timeout = Config.AWS_READ_TIMEOUT,
+        tcp_keepalive = True,
+        retries = { "max_attempts" : Config.AWS_MAX_ATTEMPTS, "mode" : "standard" },
+    )
+
+
+class ThreadLocalTable:
+    """
+    DynamoDB Table handle that is safe to share between threads.
+    boto3 resources must not be used from several threads, so every attribute is looked up
+    on the calling thread's own Table when it is used: a bound method like `table.get_item`
+    taken on the event loop and run on a db executor thread uses the executor thread's Table.
+    """
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self.name = name
+
+    def __getattr__(self, attribute):
+        value = getattr(self._registry._thread_table(self.name), attribute)
+        if not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            return getattr(self._registry._thread_table(self.name), attribute)(*args, **kwargs)
+        return call
+
+    def __repr__(self):
+        return f"ThreadLocalTable(name={self.name!r})"
+
+
+class AwsRegistry:
+    """
+    Process-wide registry of the boto3 session, resources, clients and tables.
+    Low-level clients are thread-safe and created once per process, so warm Lambda
+    invocations and server workers share their connection pool and endpoint resolution.
+    Resources are not thread-safe: one is built per process, and each thread gets a cheap
+    copy of it wrapping that same shared client. `table` hands out ThreadLocalTable handles
+    that resolve to the calling thread's Table.
+    Tests can swap any entry with `override` and start over with `reset`.
+    """
+
+    def __init__(self, boto_config=None):
+        self._boto_config = boto_config
+        self._lock = threading.RLock()
+        self._session = None
+        self._local = threading.local()
+        self._resource_overrides = {}
+        self._prototypes = {}
+        self._clients = {}
+        self._tables = {}
+
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import boto3.session
+                    self._session = boto3.session.Session()
+        return self._session
+
+    def resource(self, service_name):
+        """The calling thread's resource, or the override shared by every thread"""
+        resource = self._resource_overrides.get(service_name)
+        if resource is not None:
+            return resource
+
+        local = self._local
+        resources = getattr(local, "resources", None)
+        if resources is None:
+            resources = local.resources = {}
+        resource = resources.get(service_name)
+        if resource is None:
+            prototype = self._prototype(service_name)
+            # Same resource class around the same thread-safe client, no session work or lock
+            resource = resources[service_name] = type(prototype)(client=prototype.meta.client)
+        return resource
+
+    def client(self, service_name):
+        client = self._clients.get(service_name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(service_name)
+                if client is None:
+                    client = self.session().client(service_name, config=self._get_boto_config())
+                    self._clients[service_name] = client
+        return client
+
+    def table(self, table_name):
+        table = self._tables.get(table_name)
+        if table is None:
+            with self._lock:
+                table = self._tables.setdefault(table_name, ThreadLocalTable(self, table_name))
+        return table
+
+    def override(self, service_name, client=None, resource=None):
+        with self._lock:
+            if client is not None:
+                self._clients[service_name] = client
+            if resource is not None:
+                self._resource_overrides[service_name] = resource
+
+    def reset(self):
+        with self._lock:
+            self._session = None
+            # Other threads drop their resources and tables on their next lookup
+            self._local = threading.local()
+            self._resource_overrides.clear()
+            self._prototypes.clear()
+            self._clients.clear()
+            self._tables.clear()
+
+    def _prototype(self, service_name):
+        prototype = self._prototypes.get(service_name)
+        if prototype is None:
+            # The session itself isn't thread-safe, creating from it is serialized
+            with self._lock:
+                prototype = self._prototypes.get(service_name)
+                if prototype is None:
+                    prototype = self.session().resource(service_name, config=self._get_boto_config())
+                    self._prototypes[service_name] = prototype
+        return prototype
+
+    def _thread_table(self, table_name):
+        resource = self.resource("dynamodb")
+        local = self._local
+        tables = getattr(local, "tables", None)
+        if tables is None:
+            tables = local.tables = {}
+        cached = tables.get(table_name)
+        # Rebuilt when an override replaced the resource this thread's Table came from
+        if cached is None or cached[0] is not resource:
+            cached = tables[table_name] = (resource, resource.Table(table_name))
+        return cached[1]
+
+    def _get_boto_config(self):
+        if self._boto_config is None:
+            self._boto_config = default_boto_config()
+        return self._boto_config
+
+
+aws = AwsRegistry()
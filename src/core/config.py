@@ -10,6 +10,7 @@ class Config():
     APP_SECRET       = os.environ.get('APP_SECRET')
     JWT_ALGO         = os.environ.get('JWT_ALGO')
     JWT_EXPIRY_MIN   = int(os.environ.get('JWT_EXPIRY_MIN'))
+    JWT_CACHE_SIZE   = int(os.environ.get('JWT_CACHE_SIZE', 10000))
     AWS_S3_BUCKET_NAME   = os.environ.get('AWS_S3_BUCKET_NAME')
     ALLOWED_ORIGINS  = os.environ.get('ALLOWED_ORIGINS')
     GOOGLE_CLIENT_ID  = os.environ.get('GOOGLE_CLIENT_ID')
@@ -20,4 +21,66 @@ class Config():
     USERS_TABLE = os.environ.get('USERS_TABLE')
     TTL_TABLE = os.environ.get('TTL_TABLE')
     BOT_PROTECTION=os.environ.get('BOT_PROTECTION')
+    USER_NAME_INDEX = os.environ.get('USER_NAME_INDEX', 'user_name-index')
+    EMAIL_INDEX = os.environ.get('EMAIL_INDEX', 'email-index')
+    INDEX_BACKFILL_RETRY = int(os.environ.get('INDEX_BACKFILL_RETRY', 30))
+    AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 50))
+    AWS_CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', 2))
+    AWS_READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', 5))
+    AWS_MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', 3))
+    DB_MAX_WORKERS = int(os.environ.get('DB_MAX_WORKERS', 16))
+    S3_MAX_WORKERS = int(os.environ.get('S3_MAX_WORKERS', 4))
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+    BCRYPT_MAX_WORKERS = int(os.environ.get('BCRYPT_MAX_WORKERS', 2))
+    ASSET_MANIFEST_TTL = int(os.environ.get('ASSET_MANIFEST_TTL', 60))
+    PRESIGNED_URL_EXPIRY = int(os.environ.get('PRESIGNED_URL_EXPIRY', 1200))
+    PRESIGNED_URL_SAFETY_MARGIN = int(os.environ.get('PRESIGNED_URL_SAFETY_MARGIN', 300))
+    PRESIGNED_URL_CACHE_SIZE = int(os.environ.get('PRESIGNED_URL_CACHE_SIZE', 4096))
+    # Keep max-age + stale-while-revalidate below the presigned URL safety margin
+    ASSETS_CACHE_MAX_AGE = int(os.environ.get('ASSETS_CACHE_MAX_AGE', 60))
+    ASSETS_STALE_WHILE_REVALIDATE = int(os.environ.get('ASSETS_STALE_WHILE_REVALIDATE', 120))
+    ASSET_PREFIXES = tuple(os.environ.get('ASSET_PREFIXES', 'pictures/,carousel/').split(','))
+    DERIVED_PREFIX = os.environ.get('DERIVED_PREFIX', 'derived/')
+    IMAGE_VARIANT_WIDTHS = tuple(int(width) for width in os.environ.get('IMAGE_VARIANT_WIDTHS', '480,960,1600').split(','))
+    IMAGE_THUMBNAIL_SIZE = int(os.environ.get('IMAGE_THUMBNAIL_SIZE', 320))
+    IMAGE_WEBP_QUALITY = int(os.environ.get('IMAGE_WEBP_QUALITY', 80))
+    IMAGE_PLACEHOLDER_SIZE = int(os.environ.get('IMAGE_PLACEHOLDER_SIZE', 16))
+    IMAGE_METADATA_CACHE_SIZE = int(os.environ.get('IMAGE_METADATA_CACHE_SIZE', 4096))
+    GALLERY_TABLE = os.environ.get('GALLERY_TABLE')
+    TURNSTILE_TIMEOUT = float(os.environ.get('TURNSTILE_TIMEOUT', 3))
+    TURNSTILE_CACHE_TTL = int(os.environ.get('TURNSTILE_CACHE_TTL', 300))
+    TURNSTILE_CACHE_SIZE = int(os.environ.get('TURNSTILE_CACHE_SIZE', 1024))
+    TURNSTILE_FAILURE_THRESHOLD = int(os.environ.get('TURNSTILE_FAILURE_THRESHOLD', 5))
+    TURNSTILE_RESET_TIMEOUT = int(os.environ.get('TURNSTILE_RESET_TIMEOUT', 30))
+    TURNSTILE_FAIL_OPEN = os.environ.get('TURNSTILE_FAIL_OPEN', 'NO')
+    SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+    SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+    SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', 'YES')
+    SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', 10))
+    EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 20))
+    EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', 3))
+    EMAIL_RETRY_BACKOFF = float(os.environ.get('EMAIL_RETRY_BACKOFF', 1))
+    EMAIL_FLUSH_TIMEOUT = float(os.environ.get('EMAIL_FLUSH_TIMEOUT', 10))
+    EMAIL_QUEUE_URL = os.environ.get('EMAIL_QUEUE_URL')
+    # Set by the Lambda runtime
+    AWS_LAMBDA_FUNCTION_NAME = os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+    IMPORT_BUDGET_MS = int(os.environ.get('IMPORT_BUDGET_MS', 1500))
+    OTP_TTL_SECONDS = int(os.environ.get('OTP_TTL_SECONDS', 600))
+    OTP_MAX_REQUESTS = int(os.environ.get('OTP_MAX_REQUESTS', 4))
+    RATE_LIMIT_WINDOW = int(os.environ.get('RATE_LIMIT_WINDOW', 60))
+    LOGIN_RATE_LIMIT = int(os.environ.get('LOGIN_RATE_LIMIT', 10))
+    LOGIN_ACCOUNT_RATE_LIMIT = int(os.environ.get('LOGIN_ACCOUNT_RATE_LIMIT', 100))
+    REGISTER_RATE_LIMIT = int(os.environ.get('REGISTER_RATE_LIMIT', 5))
+    GOOGLE_LOGIN_RATE_LIMIT = int(os.environ.get('GOOGLE_LOGIN_RATE_LIMIT', 20))
+    RATE_LIMIT_LOCAL_CACHE_SIZE = int(os.environ.get('RATE_LIMIT_LOCAL_CACHE_SIZE', 10000))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 2048))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    BATCH_GET_MAX_ATTEMPTS = int(os.environ.get('BATCH_GET_MAX_ATTEMPTS', 5))
+    EXPORT_SEGMENTS = int(os.environ.get('EXPORT_SEGMENTS', 4))
+    EXPORT_PAGE_SIZE = int(os.environ.get('EXPORT_PAGE_SIZE', 500))
+    EXPORT_QUEUE_SIZE = int(os.environ.get('EXPORT_QUEUE_SIZE', 8))
+    EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 500))
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'YES')
+    METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'AyyappaSannidhi')
+    METRICS_SERVICE = os.environ.get('METRICS_SERVICE', 'backend')
 
@@ -0,0 +1,32 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from src.core.config import Config
+
+# Bounded pool for blocking boto3 calls made from async routes
+db_executor = ThreadPoolExecutor(max_workers=Config.DB_MAX_WORKERS, thread_name_prefix="db")
+
+# Small pool for S3 object reads (image meta.json), so they never queue behind DynamoDB calls
+s3_executor = ThreadPoolExecutor(max_workers=Config.S3_MAX_WORKERS, thread_name_prefix="s3")
+
+# Small pool for bcrypt, which releases the GIL while hashing; bounds concurrent CPU work
+bcrypt_executor = ThreadPoolExecutor(max_workers=Config.BCRYPT_MAX_WORKERS, thread_name_prefix="bcrypt")
+
+
+async def run_blocking(func, *args, executor=db_executor, **kwargs):
+    """
+    Run a blocking callable on `executor` without stalling the event loop.
+    The caller's context variables (request timings) are carried over to the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, partial(context.run, func, *args, **kwargs))
+
+
+def run_sync(coroutine):
+    """
+    Drive a coroutine to completion from synchronous code (sync routes, scripts).
+    Must not be called from a thread that is already running an event loop.
+    """
+    return asyncio.run(coroutine)
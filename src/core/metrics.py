@@ -0,0 +1,100 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from src.core.config import Config
+from src.core.logging import logger
+
+class RequestTimings:
+    """Time spent per dependency (dynamodb, sqs, smtp, turnstile, google, bcrypt) during one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, duration_ms):
+        # Concurrent calls (asyncio.gather, executor threads) record into the same request
+        with self._lock:
+            self.durations[name] = self.durations.get(name, 0.0) + duration_ms
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        """Value of the Server-Timing header, e.g. `dynamodb;dur=12.3, total;dur=40.1`"""
+        with self._lock:
+            entries = [f"{name};dur={duration:.1f}" for name, duration in self.durations.items()]
+        entries.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(entries)
+
+current_timings: ContextVar[RequestTimings | None] = ContextVar("current_timings", default=None)
+
+def start_request():
+    timings = RequestTimings()
+    return timings, current_timings.set(timings)
+
+def end_request(token):
+    current_timings.reset(token)
+
+@contextmanager
+def timed(name):
+    """
+    Time the wrapped call as dependency `name`. Inside a request it is added to the request's
+    breakdown, outside of one (email outbox worker, warm-up) it is published on its own.
+
+        with timed("dynamodb"):
+            response = await run_blocking(table.get_item, Key=key)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        timings = current_timings.get()
+        if timings is not None:
+            timings.add(name, duration_ms)
+        else:
+            publish({ name : duration_ms }, { "route" : "background" })
+
+def publish(durations_ms, dimensions, counts=None):
+    """Emit one EMF blob with a `<name>Duration` metric (milliseconds) per entry"""
+    if Config.METRICS_ENABLED != "YES":
+        return
+    # Ephemeral metrics keep no state between flushes, so concurrent requests don't mix dimensions
+    from aws_lambda_powertools.metrics import EphemeralMetrics, MetricUnit
+    try:
+        metrics = EphemeralMetrics(namespace=Config.METRICS_NAMESPACE, service=Config.METRICS_SERVICE)
+        for dimension, value in dimensions.items():
+            metrics.add_dimension(name=dimension, value=str(value))
+        for name, duration in durations_ms.items():
+            metrics.add_metric(name=f"{name}Duration", unit=MetricUnit.Milliseconds, value=duration)
+        for name, count in (counts or {}).items():
+            metrics.add_metric(name=f"{name}Calls", unit=MetricUnit.Count, value=count)
+        metrics.flush_metrics()
+    except Exception as e:
+        logger.info(f"Error: {str(e)}, publishing metrics")
+
+def route_label(scope):
+    """
+    Low-cardinality route dimension: the matched path with path parameters put back as
+    `{name}`, or `unmatched` for requests no route handled (404s, scanners).
+    """
+    if scope.get("route") is None:
+        return "unmatched"
+    path = scope["path"]
+    for name, value in scope.get("path_params", {}).items():
+        path = path.replace(str(value), "{" + name + "}")
+    return path
+
+def publish_request(timings, route, method, status_code):
+    """Per-route latency breakdown; CloudWatch derives p50/p99 from the raw EMF values"""
+    durations = dict(timings.durations)
+    durations["request"] = timings.total_ms()
+    publish(
+        durations,
+        { "route" : route, "method" : method, "status" : f"{status_code // 100}xx" },
+        counts=dict(timings.counts)
+    )
@@ -0,0 +1,64 @@
+from src.core.config import Config
+from src.core.metrics import end_request, publish_request, route_label, start_request
+
+# Raw ASGI middleware: unlike @app.middleware("http") (BaseHTTPMiddleware) there is no extra
+# task or response stream per request, the wrapped app talks to the server directly.
+
+FORBIDDEN_BODY = b'{"detail":"Forbidden: Missing Origin header"}'
+FORBIDDEN_START = {
+    "type" : "http.response.start",
+    "status" : 403,
+    "headers" : [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(FORBIDDEN_BODY)).encode()),
+    ],
+}
+FORBIDDEN_BODY_MESSAGE = { "type" : "http.response.body", "body" : FORBIDDEN_BODY }
+
+
+class OriginEnforcementMiddleware:
+    """Reject requests without an Origin header with a prebuilt 403 (enabled in production)"""
+
+    def __init__(self, app, enabled=None):
+        self.app = app
+        self.enabled = (Config.APP_ENV == "production") if enabled is None else enabled
+
+    async def __call__(self, scope, receive, send):
+        if self.enabled and scope["type"] == "http" and not any(name == b"origin" for name, _ in scope["headers"]):
+            await send(FORBIDDEN_START)
+            await send(FORBIDDEN_BODY_MESSAGE)
+            return
+        await self.app(scope, receive, send)
+
+
+class RequestMetricsMiddleware:
+    """
+    Collect the request's latency breakdown (see src.core.metrics) and publish it once the
+    response is done; outside production the breakdown is also sent as a Server-Timing header.
+    """
+
+    def __init__(self, app, server_timing=None):
+        self.app = app
+        self.server_timing = (Config.APP_ENV != "production") if server_timing is None else server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings, token = start_request()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    message = dict(message, headers=[*message.get("headers", []), (b"server-timing", timings.server_timing().encode())])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            end_request(token)
+            publish_request(timings, route_label(scope), scope["method"], status_code)
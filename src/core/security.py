@@ -1,15 +1,27 @@
-import bcrypt
-from cachetools import TTLCache
+from cachetools import TLRUCache
 from fastapi import HTTPException, status
-import jwt
 from src.core.config import Config
+from src.core.executors import bcrypt_executor, run_blocking
+from src.core.metrics import timed
+from src.core.startup import LazyModule
 import secrets
+import threading
+import time
 
-jwt_cache = TTLCache(maxsize=100, ttl=5)
+# Decoded claims, each entry lives until its token's own `exp`
+jwt_cache = TLRUCache(
+    maxsize=Config.JWT_CACHE_SIZE,
+    ttu=lambda _token, claims, now: claims.get("exp", now + 5),
+    timer=time.time
+)
+jwt_cache_lock = threading.Lock()
 
-def hash_password(plain_password: str) -> str:
-    # Generate a salt with bcrypt (this is a random value used in hashing)
-    salt = bcrypt.gensalt()
+bcrypt = LazyModule("bcrypt")
+jwt = LazyModule("jwt")
+
+def hash_password(plain_password: str, rounds: int = None) -> str:
+    # Generate a salt with bcrypt (this is a random value used in hashing), the cost comes from config
+    salt = bcrypt.gensalt(rounds=rounds or Config.BCRYPT_ROUNDS)
 
     # Hash the password with the salt
     hashed_password = bcrypt.hashpw(plain_password.encode('utf-8'), salt)
@@ -21,16 +33,34 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     # Check if the provided password matches the hashed password
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    # bcrypt hashes look like $2b$<cost>$<salt+hash>
+    try:
+        return int(hashed_password.split("$")[2]) != Config.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+async def hash_password_async(plain_password: str) -> str:
+    with timed("bcrypt"):
+        return await run_blocking(hash_password, plain_password, executor=bcrypt_executor)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    with timed("bcrypt"):
+        return await run_blocking(verify_password, plain_password, hashed_password, executor=bcrypt_executor)
+
 
 def decode_jwt(token: str) -> dict:
     # Check if the token is already cached
-    if token in jwt_cache:
-        return jwt_cache[token]
+    with jwt_cache_lock:
+        decoded_payload = jwt_cache.get(token)
+    if decoded_payload is not None:
+        return decoded_payload
     
     try:
         decoded_payload = jwt.decode(token, Config.APP_SECRET, algorithms=[Config.JWT_ALGO])
-        # Cache the decoded payload for future requests for the next 5 seconds
-        jwt_cache[token] = decoded_payload
+        # Cache the decoded payload until the token expires
+        with jwt_cache_lock:
+            jwt_cache[token] = decoded_payload
         return decoded_payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(
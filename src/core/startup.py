@@ -0,0 +1,91 @@
+"""
+Cold start report for the Lambda entry point.
+
+    python -m src.core.startup [--module app] [--top 25] [--budget-ms N]
+
+Imports the module in a fresh interpreter with `-X importtime`, prints the slowest
+modules (cumulative import time) and the total, and exits with status 1 when the
+total exceeds the budget (IMPORT_BUDGET_MS by default), so CI can gate on it.
+"""
+import argparse
+import importlib
+import subprocess
+import sys
+import time
+
+# Set when this module is first imported, app.py imports it first thing
+process_started = time.perf_counter()
+
+
+def init_duration_ms():
+    return (time.perf_counter() - process_started) * 1000
+
+
+class LazyModule:
+    """
+    Module-level stand-in for a dependency kept out of the cold start: `jwt = LazyModule("jwt")`
+    imports jwt on the first attribute access, e.g. `jwt.encode(...)`, and reuses it afterwards.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attribute):
+        return getattr(importlib.import_module(self._name), attribute)
+
+    def __repr__(self):
+        return f"LazyModule({self._name!r})"
+
+
+def measure_imports(module="app"):
+    """Return ({module: cumulative_ms}, total_ms) for importing `module` in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"import {module} failed")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        try:
+            cumulative_us = int(cumulative.strip())
+        except ValueError:
+            # Header line
+            continue
+        timings[name.strip()] = cumulative_us / 1000
+    return timings, timings.get(module, 0.0)
+
+
+def report(module="app", top=25):
+    timings, total = measure_imports(module)
+    slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[:top]
+    lines = [f"{duration:10.1f} ms  {name}" for name, duration in slowest]
+    lines.append(f"{total:10.1f} ms  total import of {module}")
+    return "\n".join(lines), total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold start import time report")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--budget-ms", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    from src.core.config import Config
+    budget = args.budget_ms if args.budget_ms is not None else Config.IMPORT_BUDGET_MS
+
+    text, total = report(args.module, args.top)
+    print(text)
+    if total > budget:
+        print(f"Import time {total:.1f} ms exceeds the budget of {budget} ms")
+        return 1
+    print(f"Import time {total:.1f} ms is within the budget of {budget} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import time
+from src.core.aws import aws
+from src.core.config import Config
+from src.core.logging import logger
+
+
+def is_warmup_event(event):
+    """Scheduled EventBridge keep-warm pings, or an explicit {"warmup": true} test payload"""
+    if not isinstance(event, dict):
+        return False
+    if event.get("warmup") is True:
+        return True
+    return event.get("source") == "aws.events" and event.get("detail-type") == "Scheduled Event"
+
+
+def prime():
+    """
+    Create the AWS clients, open their connections and fill the caches that the first
+    real request would otherwise pay for. Failures are logged and skipped, priming is
+    best effort. Returns the duration of each step in milliseconds.
+    """
+    # Imported here so the warm-up path doesn't pull the service modules in before it runs
+    from src.services.assets import get_manifest, presigned_urls
+    from src.services.gallery import get_gallery_index
+    from src.services.google_token import google_token_verifier
+
+    def prime_dynamodb():
+        for table_name in (Config.USERS_TABLE, Config.TTL_TABLE):
+            table = aws.table(table_name)
+            # A point read on a missing key is the cheapest way to open a pooled connection
+            table.get_item(Key={ table.key_schema[0]["AttributeName"] : "__warmup__" })
+
+    def prime_assets():
+        s3 = aws.client("s3")
+        gallery_index = get_gallery_index()
+        for prefix, page_size in (("carousel/", None), ("pictures/", 20)):
+            if gallery_index is not None:
+                items, _ = gallery_index.page(prefix.rstrip("/"), size=page_size)
+                keys = [item["object_key"] for item in items]
+            else:
+                manifest = get_manifest(Config.AWS_S3_BUCKET_NAME, prefix)
+                manifest.ensure_fresh(s3)
+                keys, _ = manifest.page(size=page_size)
+            for key in keys:
+                presigned_urls.get(s3, Config.AWS_S3_BUCKET_NAME, key)
+
+    def prime_auth():
+        import jwt  # noqa: F401, imported for its side effect on the module cache
+        google_token_verifier.get_certs()
+
+    timings = {}
+    for name, step in (("dynamodb", prime_dynamodb), ("assets", prime_assets), ("auth", prime_auth)):
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.info(f"Error: {str(e)}, while priming {name}")
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    logger.info(f"Primed caches and clients {timings}")
+    return timings
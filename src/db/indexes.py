@@ -0,0 +1,62 @@
+import time
+from src.core.aws import aws
+from src.core.config import Config
+from src.core.logging import logger
+
+# GSI name -> partition key attribute used for the user lookups
+USER_TABLE_INDEXES = {
+    Config.USER_NAME_INDEX : "user_name",
+    Config.EMAIL_INDEX : "email",
+}
+
+def ensure_indexes(users_table, wait=True, poll_seconds=10):
+    """
+    Create the lookup GSIs that are missing on the users table.
+    DynamoDB accepts a single GSI creation per UpdateTable call, so with `wait`
+    each index is waited on until ACTIVE before the next one is requested.
+
+    :return: Names of the indexes that were created.
+    """
+    users_table.reload()
+    existing_indexes = { index["IndexName"] for index in users_table.global_secondary_indexes or [] }
+    billing_mode = (users_table.billing_mode_summary or {}).get("BillingMode", "PROVISIONED")
+
+    created = []
+    for index_name, attribute in USER_TABLE_INDEXES.items():
+        if index_name in existing_indexes:
+            continue
+
+        create_index = {
+            "IndexName" : index_name,
+            "KeySchema" : [{ "AttributeName" : attribute, "KeyType" : "HASH" }],
+            "Projection" : { "ProjectionType" : "ALL" },
+        }
+        if billing_mode == "PROVISIONED":
+            create_index["ProvisionedThroughput"] = {
+                "ReadCapacityUnits" : users_table.provisioned_throughput["ReadCapacityUnits"],
+                "WriteCapacityUnits" : users_table.provisioned_throughput["WriteCapacityUnits"],
+            }
+
+        logger.info(f"Creating index {index_name} on {users_table.name}")
+        users_table.meta.client.update_table(
+            TableName = users_table.name,
+            AttributeDefinitions = [{ "AttributeName" : attribute, "AttributeType" : "S" }],
+            GlobalSecondaryIndexUpdates = [{ "Create" : create_index }],
+        )
+        created.append(index_name)
+        if wait:
+            wait_for_index(users_table, index_name, poll_seconds)
+
+    return created
+
+def wait_for_index(table, index_name, poll_seconds=10):
+    while True:
+        table.reload()
+        statuses = { index["IndexName"] : index["IndexStatus"] for index in table.global_secondary_indexes or [] }
+        if table.table_status == "ACTIVE" and statuses.get(index_name) == "ACTIVE":
+            return
+        time.sleep(poll_seconds)
+
+
+if __name__ == "__main__":
+    print(ensure_indexes(aws.table(Config.USERS_TABLE)))
@@ -2,10 +2,9 @@
 
 from typing import Optional
 import uuid
-from pydantic import BaseModel, Field, model_validator
+from pydantic import BaseModel, Field
 
 from src.common.enums import UserAccountType, UserType
-from src.core.security import hash_password
 
 
 class UserTable(BaseModel):
@@ -18,11 +17,3 @@ class UserTable(BaseModel):
     picture : Optional[str] = ""
     user_type : UserType
     account_type : UserAccountType
-    
-    @model_validator(mode="before")
-    def hash_password(cls,values):
-        if values.get("password"):
-            values["password"] = hash_password(values["password"])
-        return values
-    
-    
\ No newline at end of file
@@ -0,0 +1,197 @@
+import asyncio
+import random
+from botocore.exceptions import ClientError
+from cachetools import TTLCache
+from src.core.config import Config
+from src.core.executors import run_blocking
+from src.core.metrics import timed
+from src.core.logging import logger
+
+# (table name, index name) pairs known to be missing, re-checked every 5 minutes
+missing_indexes = TTLCache(maxsize=16, ttl=300)
+# Indexes still backfilling after creation, re-checked often so queries resume once it's done
+backfilling_indexes = TTLCache(maxsize=16, ttl=Config.INDEX_BACKFILL_RETRY)
+
+# Every user attribute except the password hash
+PUBLIC_USER_ATTRIBUTES = ("user_id", "full_name", "user_name", "email", "phone_number", "picture", "user_type", "account_type")
+
+BATCH_GET_LIMIT = 100
+
+async def db_call(func, *args, **kwargs):
+    """Blocking DynamoDB call run off the event loop, timed as `dynamodb`"""
+    with timed("dynamodb"):
+        return await run_blocking(func, *args, **kwargs)
+
+
+def is_success(response):
+    return response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 200
+
+def is_missing_index_error(error: ClientError):
+    """
+    True only when a Query failed because the GSI doesn't exist. Other ValidationExceptions,
+    such as an empty key value, must not switch the table over to scans.
+    """
+    message = error.response["Error"].get("Message", "")
+    # DynamoDB: "The table does not have the specified index", DynamoDB Local/moto: "Invalid index"
+    return "specified index" in message or "Invalid index" in message
+
+def is_backfilling_index_error(error: ClientError):
+    # "Cannot read from backfilling global secondary index: <name>" while ensure_indexes builds it
+    return "backfilling" in error.response["Error"].get("Message", "")
+
+
+class UserRepository:
+    """
+    Async access to the users table.
+    Every boto3 call is offloaded to the bounded db executor, so awaiting it never
+    blocks the event loop and independent lookups can run concurrently.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    async def get_by_id(self, user_id):
+        response = await db_call(self.table.get_item, Key={ "user_id" : user_id })
+        return response.get("Item")
+
+    async def get_by_user_name(self, user_name):
+        items = await self.find_by_attribute(Config.USER_NAME_INDEX, "user_name", user_name)
+        return items[0] if items else None
+
+    async def get_by_email(self, email):
+        from boto3.dynamodb.conditions import Attr
+        # OTP users are registered with their email as user name
+        items = await self.find_by_attribute(
+            Config.EMAIL_INDEX, "email", email,
+            filter_expression=Attr("user_name").eq(email)
+        )
+        return items[0] if items else None
+
+    async def find_by_attribute(self, index_name, attribute, value, filter_expression=None):
+        """
+        Find users whose `attribute` equals `value` through the GSI `index_name`.
+        Falls back to a paginated scan while the index does not exist on the table.
+        """
+        from boto3.dynamodb.conditions import Attr, Key
+        # Empty strings are never valid key values, and no stored user can match one
+        if value is None or value == "":
+            return []
+
+        index_key = (self.table.name, index_name)
+        if index_key not in missing_indexes and index_key not in backfilling_indexes:
+            query_kwargs = {
+                "IndexName": index_name,
+                "KeyConditionExpression": Key(attribute).eq(value)
+            }
+            if filter_expression is not None:
+                query_kwargs["FilterExpression"] = filter_expression
+            try:
+                response = await db_call(self.table.query, **query_kwargs)
+                return response.get("Items", [])
+            except ClientError as e:
+                if is_missing_index_error(e):
+                    missing_indexes[index_key] = True
+                elif is_backfilling_index_error(e):
+                    backfilling_indexes[index_key] = True
+                else:
+                    raise
+                logger.info(f"Index {index_name} not available on {self.table.name}, falling back to scan")
+
+        condition = Attr(attribute).eq(value)
+        if filter_expression is not None:
+            condition = condition & filter_expression
+        scan_kwargs = { "FilterExpression": condition }
+        while True:
+            response = await db_call(self.table.scan, **scan_kwargs)
+            if response.get("Items"):
+                return response["Items"]
+            if "LastEvaluatedKey" not in response:
+                return []
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    async def batch_get_by_ids(self, user_ids, attributes=PUBLIC_USER_ATTRIBUTES):
+        """
+        Load many users with BatchGetItem: ids are split into chunks of 100 keys that are
+        fetched concurrently, UnprocessedKeys are retried with exponential backoff.
+        Returns the found items keyed by user_id.
+        """
+        unique_ids = list(dict.fromkeys(user_ids))
+        chunks = [unique_ids[i:i + BATCH_GET_LIMIT] for i in range(0, len(unique_ids), BATCH_GET_LIMIT)]
+        results = await asyncio.gather(*(self._batch_get_chunk(chunk, attributes) for chunk in chunks))
+        return { item["user_id"] : item for items in results for item in items }
+
+    async def _batch_get_chunk(self, user_ids, attributes):
+        names = { f"#a{index}" : attribute for index, attribute in enumerate(attributes) }
+        request = {
+            "Keys" : [{ "user_id" : user_id } for user_id in user_ids],
+            "ProjectionExpression" : ", ".join(names),
+            "ExpressionAttributeNames" : names,
+        }
+
+        items = []
+        for attempt in range(Config.BATCH_GET_MAX_ATTEMPTS):
+            response = await db_call(self.table.meta.client.batch_get_item, RequestItems={ self.table.name : request })
+            items.extend(response.get("Responses", {}).get(self.table.name, []))
+            unprocessed = response.get("UnprocessedKeys", {}).get(self.table.name)
+            if not unprocessed:
+                return items
+            request = unprocessed
+            await asyncio.sleep(min(0.05 * 2 ** attempt, 1) * random.uniform(0.5, 1))
+
+        raise RuntimeError(f"{len(request['Keys'])} keys still unprocessed after {Config.BATCH_GET_MAX_ATTEMPTS} attempts")
+
+    async def create(self, item):
+        return is_success(await db_call(self.table.put_item, Item=item))
+
+    async def update(self, user_id, update_expression, expression_attribute_values):
+        response = await db_call(
+            self.table.update_item,
+            Key = { "user_id" : user_id },
+            UpdateExpression = update_expression,
+            ExpressionAttributeValues = expression_attribute_values
+        )
+        return is_success(response)
+
+
+class TtlRepository:
+    """Async access to the TTL table, same executor offloading as UserRepository"""
+
+    def __init__(self, table):
+        self.table = table
+
+    async def get(self, id):
+        response = await db_call(self.table.get_item, Key={ "id" : id })
+        return response.get("Item")
+
+    async def put(self, record, condition_expression=None, expression_attribute_values=None):
+        put_kwargs = { "Item" : record }
+        if condition_expression:
+            put_kwargs["ConditionExpression"] = condition_expression
+            put_kwargs["ExpressionAttributeValues"] = expression_attribute_values
+        return is_success(await db_call(self.table.put_item, **put_kwargs))
+
+    async def update(self, id, update_expression, expression_attribute_values):
+        response = await db_call(
+            self.table.update_item,
+            Key = { "id" : id },
+            UpdateExpression = update_expression,
+            ExpressionAttributeValues = expression_attribute_values
+        )
+        return is_success(response)
+
+    async def conditional_update(self, id, update_expression, condition_expression, expression_attribute_values):
+        """
+        Apply the update only when `condition_expression` holds and return the item as written.
+        A failed condition raises ClientError(ConditionalCheckFailedException) carrying the
+        current item under response["Item"] in DynamoDB's low-level format.
+        """
+        response = await db_call(
+            self.table.update_item,
+            Key = { "id" : id },
+            UpdateExpression = update_expression,
+            ConditionExpression = condition_expression,
+            ExpressionAttributeValues = expression_attribute_values,
+            ReturnValues = "ALL_NEW",
+            ReturnValuesOnConditionCheckFailure = "ALL_OLD"
+        )
+        return response["Attributes"]
@@ -1,7 +1,7 @@
 import re
 from typing import Optional
 from fastapi import HTTPException,status
-from pydantic import BaseModel, model_validator
+from pydantic import BaseModel, Field, model_validator
 
 from src.common.enums import UserAccountType, UserType
 
@@ -88,6 +88,9 @@ class UserProfile(BaseModel):
     
     
     
+class UserIds(BaseModel):
+    user_ids : list[str] = Field(min_length=1, max_length=1000)
+    
 class OtpUser(BaseModel):
     email : str
     
@@ -0,0 +1,208 @@
+import base64
+import json
+import threading
+import time
+from bisect import bisect_right, insort
+from urllib.parse import unquote_plus
+from cachetools import TTLCache
+from src.core.config import Config
+from src.core.logging import logger
+from src.core.metrics import timed
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort_key):
+    return base64.urlsafe_b64encode(json.dumps(sort_key).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        neg_timestamp, key = json.loads(base64.urlsafe_b64decode(padded))
+        return (float(neg_timestamp), str(key))
+    except Exception:
+        raise InvalidCursor(cursor)
+
+
+class ObjectManifest:
+    """
+    In-process listing of one S3 prefix, kept sorted newest first.
+
+    The first request loads the full paginated listing; afterwards the first request after
+    `ttl` seconds re-lists it inline (Lambda freezes background threads between invocations)
+    while concurrent readers wait for it, and a failed refresh keeps serving the old snapshot.
+    A refresh only re-positions objects whose ETag or LastModified changed, and pages are
+    sliced from the sorted snapshot with a bisect on the cursor.
+    """
+
+    def __init__(self, bucket, prefix, ttl=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.ttl = Config.ASSET_MANIFEST_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        # key -> (etag, last_modified) and the matching sorted [(-timestamp, key)] snapshot
+        self._objects = {}
+        self._order = []
+        self.version = 0
+        self.last_modified = None
+
+    @property
+    def total(self):
+        return len(self._order)
+
+    def etag(self, key):
+        entry = self._objects.get(key)
+        return entry[0] if entry else None
+
+    def ensure_fresh(self, s3):
+        if self._loaded_at is None:
+            with self._lock:
+                if self._loaded_at is None:
+                    self._refresh(s3)
+            return
+
+        if time.monotonic() - self._loaded_at < self.ttl:
+            return
+        with self._lock:
+            # Another request may have refreshed it while this one waited
+            if time.monotonic() - self._loaded_at < self.ttl:
+                return
+            try:
+                self._refresh(s3)
+            except Exception as e:
+                logger.info(f"Error: {str(e)}, refreshing manifest for {self.prefix}")
+
+    def refresh(self, s3):
+        with self._lock:
+            self._refresh(s3)
+
+    def page(self, cursor=None, size=None):
+        """
+        Return (keys, next_cursor) for up to `size` objects after `cursor`; all objects when size is None.
+        Raises InvalidCursor for tokens this manifest did not produce.
+        """
+        order = self._order
+        start = bisect_right(order, decode_cursor(cursor)) if cursor else 0
+        end = len(order) if size is None else start + size
+        page = order[start:end]
+        next_cursor = encode_cursor(page[-1]) if page and end < len(order) else None
+        return [key for _, key in page], next_cursor
+
+    def _refresh(self, s3):
+        listing = {}
+        paginator = s3.get_paginator("list_objects_v2")
+        with timed("s3"):
+            for response in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+                for obj in response.get("Contents", []):
+                    # Skip folder placeholder objects such as "pictures/"
+                    if obj["Key"].endswith("/"):
+                        continue
+                    listing[obj["Key"]] = (obj.get("ETag"), obj["LastModified"])
+
+        previous = self._objects
+        removed = [key for key in previous if key not in listing]
+        changed = [key for key, value in listing.items() if previous.get(key) != value]
+        if removed or changed:
+            self._order = self._apply_delta(previous, listing, removed, changed)
+            self._objects = listing
+            self.version += 1
+            self.last_modified = max((value[1] for value in listing.values()), default=None)
+        self._loaded_at = time.monotonic()
+
+    def _apply_delta(self, previous, listing, removed, changed):
+        if len(removed) + len(changed) > len(listing) // 4:
+            return sorted(self._sort_key(key, value[1]) for key, value in listing.items())
+
+        order = list(self._order)
+        for key in removed + [key for key in changed if key in previous]:
+            sort_key = self._sort_key(key, previous[key][1])
+            index = bisect_right(order, sort_key) - 1
+            if index >= 0 and order[index] == sort_key:
+                del order[index]
+        for key in changed:
+            insort(order, self._sort_key(key, listing[key][1]))
+        return order
+
+    @staticmethod
+    def _sort_key(key, last_modified):
+        # Newest first, ties broken by key so the order (and cursors) are stable
+        return (-last_modified.timestamp(), key)
+
+
+def s3_event_records(event):
+    """
+    Yield (created, bucket, key, etag) for S3 object notifications, delivered either directly
+    by S3 (`Records`, URL-encoded keys) or through EventBridge (`Object Created/Deleted`).
+    """
+    for record in event.get("Records", []):
+        if "s3" not in record:
+            continue
+        s3_object = record["s3"]["object"]
+        yield (
+            not record["eventName"].startswith("ObjectRemoved"),
+            record["s3"]["bucket"]["name"],
+            unquote_plus(s3_object["key"]),
+            s3_object.get("eTag")
+        )
+    if event.get("source") == "aws.s3" and event.get("detail-type") in ("Object Created", "Object Deleted"):
+        detail = event["detail"]
+        yield (event["detail-type"] == "Object Created", detail["bucket"]["name"], detail["object"]["key"], detail["object"].get("etag"))
+
+
+manifests = {}
+manifests_lock = threading.Lock()
+
+def get_manifest(bucket, prefix):
+    manifest = manifests.get((bucket, prefix))
+    if manifest is None:
+        with manifests_lock:
+            manifest = manifests.setdefault((bucket, prefix), ObjectManifest(bucket, prefix))
+    return manifest
+
+
+class PresignedUrlCache:
+    """
+    Bounded LRU cache of presigned GET URLs keyed by (bucket, key).
+    A URL is handed out again until `safety_margin` seconds before it expires, so
+    responses carry stable image URLs that browsers and CDNs can cache.
+    """
+
+    def __init__(self, maxsize=None, expires_in=None, safety_margin=None):
+        self.expires_in = expires_in or Config.PRESIGNED_URL_EXPIRY
+        safety_margin = Config.PRESIGNED_URL_SAFETY_MARGIN if safety_margin is None else safety_margin
+        self._cache = TTLCache(
+            maxsize=maxsize or Config.PRESIGNED_URL_CACHE_SIZE,
+            ttl=max(self.expires_in - safety_margin, 1),
+            timer=time.time
+        )
+        self._lock = threading.Lock()
+
+    def get(self, s3, bucket, key):
+        return self.get_with_issue_time(s3, bucket, key)[0]
+
+    def get_with_issue_time(self, s3, bucket, key):
+        """Return (url, issued_at epoch seconds)"""
+        with self._lock:
+            entry = self._cache.get((bucket, key))
+        if entry is not None:
+            return entry
+
+        url = s3.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": bucket, "Key": key},
+            ExpiresIn=self.expires_in
+        )
+        entry = (url, time.time())
+        with self._lock:
+            self._cache[(bucket, key)] = entry
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+presigned_urls = PresignedUrlCache()
@@ -3,16 +3,15 @@ from typing import Optional
 from typing import Callable
 from functools import wraps
 from fastapi import Request, HTTPException, status
-import jwt
 import datetime
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-import requests
 from src.common.constants import Constants
 from src.common.enums import UserType
 from src.common.methods import custom_response
 from src.core.config import Config
-from src.core.security import decode_jwt
+from src.core.security import decode_jwt, jwt
+from src.db.repository import TtlRepository
+from src.services.google_token import google_token_verifier
+from src.services.turnstile import turnstile_verifier
 import time
 from botocore.exceptions import ClientError
 from src.core.logging import logger
@@ -57,177 +56,127 @@ def create_refresh_token(data: dict, secret_key : str, algorithm : str,expires_m
     return encoded_jwt
 
 def verify_google_token(google_user_token : str):
+    import requests
     try:
-        response = id_token.verify_oauth2_token(
-                    google_user_token, 
-                    google_requests.Request(), 
-                    Config.GOOGLE_CLIENT_ID
-        )
-        return response
-    except ValueError as e:
-        print(f"Error: {str(e)}")
+        return google_token_verifier.verify(google_user_token)
+    except (ValueError, requests.RequestException) as e:
+        logger.info(f"Error: {str(e)}")
         return None
     
 
-def verify_jwt(func: Callable):
-    @wraps(func)
-    async def wrapper(request: Request, *args, **kwargs):        
-        # Extract cookies from the request
-        access_token = request.cookies.get("access_token")
-        if not access_token or not access_token.startswith("Bearer "):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Missing or invalid tokens."
-            )
+def get_token_claims(request: Request) -> dict:
+    """Decode the access token cookie once per request, the claims are kept on request.state"""
+    claims = getattr(request.state, "claims", None)
+    if claims is not None:
+        return claims
+
+    # Extract cookies from the request
+    access_token = request.cookies.get("access_token")
+    if not access_token or not access_token.startswith("Bearer "):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Missing or invalid tokens."
+        )
 
-        # Extract token
-        token = access_token.split(" ")[1]
+    # Decode the token, decode_jwt raises 401 for expired or invalid tokens
+    request.state.claims = decode_jwt(access_token.split(" ")[1])
+    return request.state.claims
 
-        try:
-            # Decode the token
-            decoded_payload = decode_jwt(token)
-        except jwt.ExpiredSignatureError:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token has expired."
-            )
-        except jwt.JWTError:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token."
-            )
-
-        # Extract additional parameters from request
-        try:
-            body = await request.json()  # Extract JSON body if it exists
-        except Exception:
-            body = {}
+def require_user(*allowed_user_types: UserType):
+    """
+    Dependency factory that authenticates the request and returns the token claims.
+    When user types are given, any other user type is rejected with 403.
 
-        user_id = body.get("user_id") or request.query_params.get("user_id") or decoded_payload.get("user_id")
-        user_type = body.get("user_type") or request.query_params.get("user_type") or decoded_payload.get("user_type")
+        claims = Depends(require_user(UserType.MEMBER))
+    """
+    allowed = { user_type.value if isinstance(user_type, UserType) else user_type for user_type in allowed_user_types }
 
-        if not user_id or not user_type:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Missing required user information (user_id or user_type)."
-            )
-        
-        # Check if the user_type from the request matches the decoded payload's user_type
-        if user_id != decoded_payload.get("user_id"):
+    async def dependency(request: Request) -> dict:
+        claims = get_token_claims(request)
+        if allowed and claims.get("user_type") not in allowed:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
-                detail="User ID mismatch."
+                detail=f"User type '{claims.get('user_type')}' does not have access to this resource."
             )
-            
-        # Check if the user_type from the request matches the decoded payload's user_type
-        if user_type != decoded_payload.get("user_type"):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="User type mismatch."
-            )
-        
+        return claims
 
-        # Call the original function
-        return await func(request, *args, **kwargs)
+    return dependency
 
-    return wrapper
+def ensure_claims_match(claims: dict, user_id=None, user_type=None):
+    """Reject requests acting on behalf of another user than the token's owner"""
+    if isinstance(user_type, UserType):
+        user_type = user_type.value
 
-def user_access(allowed_user_type: UserType):
-    def decorator(func: Callable):
+    user_id = user_id or claims.get("user_id")
+    user_type = user_type or claims.get("user_type")
+    if not user_id or not user_type:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Missing required user information (user_id or user_type)."
+        )
+    
+    # Check if the user_id from the request matches the decoded payload's user_id
+    if user_id != claims.get("user_id"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User ID mismatch."
+        )
         
-        @wraps(func)
-        async def wrapper(request: Request, *args, **kwargs):
-            # Extract Authorization header from the request
-            access_token = request.cookies.get("access_token")
-            if not access_token or not access_token.startswith("Bearer "):
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Missing or invalid tokens."
-                )
-
-            # Extract token
-            token = access_token.split(" ")[1]
-
-            try:
-                # Decode the token
-                decoded_payload = decode_jwt(token)
-            except jwt.ExpiredSignatureError:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token has expired."
-                )
-            except jwt.PyJWTError:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid token."
-                )
-
-            # Check if the provided 'type' argument matches the payload's user_type
-            if allowed_user_type != decoded_payload.get("user_type"):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail=f"User type '{type}' does not have access to this resource."
-                )
-
-            # Call the original function
-            return await func(request, *args, **kwargs)
-
-        return wrapper
-
-    return decorator
+    # Check if the user_type from the request matches the decoded payload's user_type
+    if user_type != claims.get("user_type"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User type mismatch."
+        )
 
-def add_record_with_ttl(record, ttl_seconds , table):
+async def get_existing_data_by_id_async(id, temp_ttl_table):
     try:
-        creation_time = int(time.time())
-        expiration_time = int(time.time()) + int(ttl_seconds)
-        record["creation_time"] = creation_time
-        record["expiration_time"] = expiration_time
-        table.put_item(Item=record)
-        return True
+        return await TtlRepository(temp_ttl_table).get(id)
     except Exception as e:
         logger.info(f"Error: {str(e)}")
         return None
-    
-def update_record_with_ttl(update_data, ttl_seconds, table):
+
+async def issue_otp_async(id, otp, ttl_seconds, max_requests, table):
+    """
+    Store a new OTP for `id` in one conditional UpdateItem: the previous OTP rotates into
+    old_data, request_count is incremented atomically and the TTL is renewed, and the
+    ConditionExpression enforces the request limit even under concurrent requests.
+
+    :return: The record as written, or None when the request limit is reached.
+    """
+    now = int(time.time())
+    repository = TtlRepository(table)
     try:
-        # Calculate expiration and creation times
-        expiration_time = int(time.time()) + ttl_seconds
-        creation_time = int(time.time())
-        
-        # Construct the update expression
-        update_expression = "SET expiration_time = :exp_time, creation_time = :crt_time, old_data = :old_data, new_data = :new_data, request_count = :request_count"
-        expression_attribute_values = {
-            ":exp_time": expiration_time,
-            ":crt_time": creation_time,
-            ":new_data" : update_data["new_data"],
-            ":old_data" : update_data["old_data"],
-            ":request_count" : update_data["request_count"],
-        }
-        # Update the item in the DynamoDB table
-        response = table.update_item(
-            Key={"id" : update_data["id"]},
-            UpdateExpression=update_expression,
-            ExpressionAttributeValues=expression_attribute_values,
+        return await repository.conditional_update(
+            id,
+            update_expression = "SET new_data = :otp, old_data = if_not_exists(new_data, :otp), "
+                                "creation_time = :now, expiration_time = :exp_time ADD request_count :one",
+            condition_expression = "attribute_not_exists(request_count) OR request_count < :max_requests",
+            expression_attribute_values = {
+                ":otp" : otp,
+                ":now" : now,
+                ":exp_time" : now + ttl_seconds,
+                ":one" : 1,
+                ":max_requests" : max_requests,
+            }
         )
-        return True if response.get("ResponseMetadata").get("HTTPStatusCode") == 200 else None
-        
     except ClientError as e:
-        print(f"Error: {e.response['Error']['Message']}")
-        return None
-    except Exception as e:
-        logger.info(f"Error: {str(e)}")
-        return None
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        existing = e.response.get("Item") or {}
 
-def get_existing_data_by_id(id, temp_ttl_table):
+    # DynamoDB deletes expired items lazily, an expired record at the limit starts over
+    if int(existing.get("expiration_time", {}).get("N", now)) >= now:
+        return None
+    record = { "id" : id, "new_data" : otp, "old_data" : otp, "request_count" : 1, "creation_time" : now, "expiration_time" : now + ttl_seconds }
     try:
-        response = temp_ttl_table.get_item(
-            Key={ "id": id }
-        )
-        return response["Item"] if response.get('Item') else None
-    except Exception as e:
-        logger.info(f"Error: {str(e)}")
+        await repository.put(record, "expiration_time < :now", { ":now" : now })
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
         return None
-    
+    return record
+
 def create_token(user_data,access_token = None, refresh_token = None, payload = None):
     response = defaultdict()
     if not payload:
@@ -268,27 +217,17 @@ def response_with_extra_data(message, extra_data, tokens=None, status_code=statu
 def bot_protection(func: Callable):
     @wraps(func)
     async def wrapper(request: Request, *args, **kwargs):
-        if Config.BOT_PROTECTION == "YES":
+        # Verify once per request even when the decorator is stacked
+        if Config.BOT_PROTECTION == "YES" and not getattr(request.state, "bot_verified", False):
             # Extract token from the header
             access_token = request.headers.get("Authorization")
             if not access_token:
                 return custom_response(Constants.BOT_DETECTED, status.HTTP_403_FORBIDDEN)
 
-            data = {
-                "secret": Config.TURNSTILE_SECRET_KEY,
-                "response": access_token
-            }
-
-            try:
-                print(data)
-                response = requests.post(Config.TURNSTILE_URL, data=data, timeout=10)
-                response.raise_for_status()  # Raise error for HTTP status >= 400
-                result = response.json()
-                if not result.get("success"):
-                    return custom_response(Constants.BOT_DETECTED, status.HTTP_403_FORBIDDEN)
-            except Exception as e:
-                logger.info(f"Error: {str(e)}")
+            remote_ip = request.client.host if request.client else None
+            if not await turnstile_verifier.verify(access_token, remote_ip):
                 return custom_response(Constants.BOT_DETECTED, status.HTTP_403_FORBIDDEN)
+            request.state.bot_verified = True
 
         # Call the decorated function without `await` if synchronous
         return await func(request, *args, **kwargs)
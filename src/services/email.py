@@ -1,10 +1,19 @@
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import smtplib
+import json
+import queue
+import threading
+import time
 from src.core.config import Config
+from src.core.executors import run_blocking
 from src.core.logging import logger
+from src.core.metrics import timed
+from src.core.startup import LazyModule
 
-def send_email(receipient_email, subject, body):
+smtplib = LazyModule("smtplib")
+
+
+def build_message(receipient_email, subject, body):
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
     message = MIMEMultipart()
     message['From'] = Config.SENDER_EMAIL
     message['To'] = receipient_email
@@ -12,16 +21,203 @@ def send_email(receipient_email, subject, body):
     
     # Attach the body as HTML
     message.attach(MIMEText(body, 'html'))
+    return message
 
-    try:
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
+
+class SmtpConnection:
+    """Authenticated SMTP connection kept open across messages, reopened when the server dropped it"""
+
+    def __init__(self, host=None, port=None, user=None, password=None, starttls=None, timeout=None):
+        self.host = host or Config.SMTP_HOST
+        self.port = port or Config.SMTP_PORT
+        self.user = Config.SENDER_EMAIL if user is None else user
+        self.password = Config.MAIL_APP_PASSWORD if password is None else password
+        self.starttls = (Config.SMTP_STARTTLS == "YES") if starttls is None else starttls
+        self.timeout = timeout or Config.SMTP_TIMEOUT
+        self._server = None
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock, timed("smtp"):
+            server = self._connect()
+            try:
+                server.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                # Idle connection was closed by the server, retry once on a fresh one
+                self._server = None
+                self._connect().send_message(message)
+
+    def close(self):
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except smtplib.SMTPException:
+                    pass
+                self._server = None
+
+    def reset(self):
+        # Drop a connection in an unknown state without the QUIT round trip
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.close()
+                except OSError:
+                    pass
+                self._server = None
+
+    def _connect(self):
+        if self._server is not None:
+            try:
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except smtplib.SMTPException:
+                pass
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
             server.starttls()
-            server.login(Config.SENDER_EMAIL, Config.MAIL_APP_PASSWORD)
-            server.sendmail(Config.SENDER_EMAIL, receipient_email, message.as_string())
-            print('Email sent successfully!')
-            return True
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        self._server = server
+        return server
+
+
+class EmailOutbox:
+    """
+    In-process queue of outgoing mail drained by a background worker thread, for long-lived
+    servers only: a Lambda sandbox is frozen once it returns, use EmailQueue there.
+    The worker sends everything queued in batches over one reused SMTP connection and
+    retries failed messages with exponential backoff, so requests only pay for enqueueing.
+    """
+
+    def __init__(self, connection=None, batch_size=None, max_attempts=None, retry_backoff=None):
+        self.connection = connection or SmtpConnection()
+        self.batch_size = batch_size or Config.EMAIL_BATCH_SIZE
+        self.max_attempts = max_attempts or Config.EMAIL_MAX_ATTEMPTS
+        self.retry_backoff = Config.EMAIL_RETRY_BACKOFF if retry_backoff is None else retry_backoff
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def enqueue(self, receipient_email, subject, body):
+        message = build_message(receipient_email, subject, body)
+        with self._idle:
+            self._pending += 1
+        self._queue.put(message)
+        self._ensure_worker()
+        return True
+
+    def flush(self, timeout=None):
+        """Block until every queued message was handled, returns False on timeout"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for message in batch:
+                self._deliver(message)
+
+            with self._idle:
+                self._pending -= len(batch)
+                self._idle.notify_all()
+
+    def _deliver(self, message):
+        for attempt in range(self.max_attempts):
+            try:
+                self.connection.send(message)
+                return True
+            except Exception as e:
+                logger.info(f"Error: {str(e)}, sending email to {message['To']} (attempt {attempt + 1})")
+                self.connection.reset()
+                if attempt + 1 < self.max_attempts:
+                    time.sleep(self.retry_backoff * 2 ** attempt)
+        return False
+
+
+class EmailQueue:
+    """
+    Durable queue of outgoing mail on SQS (EMAIL_QUEUE_URL). Requests only pay for one
+    SendMessage and get an error when it fails; `handle_email_event`, run by the email
+    Lambda subscribed to the queue, delivers over SMTP and SQS redelivers what failed.
+    """
+
+    def __init__(self, queue_url=None, client=None):
+        self.queue_url = queue_url or Config.EMAIL_QUEUE_URL
+        self._client = client
+
+    def enqueue(self, receipient_email, subject, body):
+        from src.core.aws import aws
+        client = self._client or aws.client("sqs")
+        message = { "to" : receipient_email, "subject" : subject, "body" : body }
+        with timed("sqs"):
+            client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(message))
+        return True
+
+
+smtp_connection = SmtpConnection()
+outbox = EmailOutbox(smtp_connection)
+email_queue = EmailQueue()
+
+
+async def queue_email(receipient_email, subject, body):
+    """
+    Hand an email over for delivery: to the SQS queue when EMAIL_QUEUE_URL is set, otherwise
+    the in-process outbox of a long-lived server. A Lambda sandbox without a queue is frozen
+    once it returns, which would strand the outbox, so there the mail is sent before answering
+    and an SMTP failure raises.
+    """
+    if Config.EMAIL_QUEUE_URL:
+        return await run_blocking(email_queue.enqueue, receipient_email, subject, body)
+    if Config.AWS_LAMBDA_FUNCTION_NAME:
+        try:
+            await run_blocking(smtp_connection.send, build_message(receipient_email, subject, body))
+        except Exception:
+            smtp_connection.reset()
+            raise
+        return True
+    return outbox.enqueue(receipient_email, subject, body)
+
+
+def handle_email_event(event, connection=None):
+    """
+    Entry point for SQS batches of queued emails. Failed messages are reported back as
+    batchItemFailures, so SQS retries only those and finally moves them to the dead-letter queue.
+    """
+    connection = connection or smtp_connection
+    failures = []
+    for record in event.get("Records", []):
+        try:
+            message = json.loads(record["body"])
+            connection.send(build_message(message["to"], message["subject"], message["body"]))
+        except Exception as e:
+            logger.error(f"Error: {str(e)}, sending queued email {record['messageId']}")
+            connection.reset()
+            failures.append({ "itemIdentifier" : record["messageId"] })
+    return { "batchItemFailures" : failures }
+
+
+def send_email(receipient_email, subject, body):
+    """Send immediately on the shared connection, bypassing the outbox"""
+    try:
+        smtp_connection.send(build_message(receipient_email, subject, body))
+        return True
     except Exception as e:
         logger.info(f"Error: {str(e)}")
         return None
-    
-    
\ No newline at end of file
@@ -0,0 +1,153 @@
+import argparse
+import csv
+import io
+import json
+import queue
+import sys
+import threading
+from decimal import Decimal
+from itertools import islice
+from src.core.config import Config
+from src.core.logging import logger
+from src.db.repository import PUBLIC_USER_ATTRIBUTES
+
+EXPORT_FORMATS = {
+    "ndjson" : "application/x-ndjson",
+    "csv" : "text/csv",
+}
+
+_SEGMENT_DONE = object()
+
+class SegmentError:
+    def __init__(self, segment, error):
+        self.segment = segment
+        self.error = error
+
+def scan_users(users_table, segments=None, page_size=None, queue_size=None, attributes=PUBLIC_USER_ATTRIBUTES):
+    """
+    Yield every user item through a DynamoDB parallel scan.
+
+    One thread scans each segment and puts whole pages on a bounded queue; when the
+    consumer falls behind the queue fills up and the scanners block, so at most
+    `queue_size` pages are held in memory whatever the size of the table.
+    Closing the generator early stops the scanners.
+    The scanners share the table's low-level client, which unlike the Table resource is
+    thread-safe, and each pages through its segment with its own paginator.
+    """
+    segments = segments or Config.EXPORT_SEGMENTS
+    page_size = page_size or Config.EXPORT_PAGE_SIZE
+    pages = queue.Queue(maxsize=queue_size or Config.EXPORT_QUEUE_SIZE)
+    stopped = threading.Event()
+    names = { f"#a{index}" : attribute for index, attribute in enumerate(attributes) }
+    # The resource's client still converts items to Python types
+    client = users_table.meta.client
+    table_name = users_table.name
+
+    def put(page):
+        while not stopped.is_set():
+            try:
+                pages.put(page, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def scan_segment(segment):
+        paginator = client.get_paginator("scan")
+        try:
+            for response in paginator.paginate(
+                TableName = table_name,
+                Segment = segment,
+                TotalSegments = segments,
+                ProjectionExpression = ", ".join(names),
+                ExpressionAttributeNames = names,
+                PaginationConfig = { "PageSize" : page_size },
+            ):
+                if stopped.is_set():
+                    return
+                if response.get("Items") and not put(response["Items"]):
+                    return
+            put(_SEGMENT_DONE)
+        except Exception as e:
+            put(SegmentError(segment, e))
+
+    scanners = [threading.Thread(target=scan_segment, args=(segment,), daemon=True) for segment in range(segments)]
+    for scanner in scanners:
+        scanner.start()
+
+    try:
+        remaining = segments
+        while remaining:
+            page = pages.get()
+            if page is _SEGMENT_DONE:
+                remaining -= 1
+            elif isinstance(page, SegmentError):
+                logger.info(f"Error: {str(page.error)}, scanning segment {page.segment} of {table_name}")
+                raise page.error
+            else:
+                yield from page
+    finally:
+        stopped.set()
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, set):
+        return sorted(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _batches(items, size=None):
+    # A streaming response pulls every chunk through a threadpool hop, so rows go out in batches
+    items = iter(items)
+    while batch := list(islice(items, size or Config.EXPORT_CHUNK_ROWS)):
+        yield batch
+
+def to_ndjson(items, chunk_rows=None):
+    for batch in _batches(items, chunk_rows):
+        yield "".join(json.dumps(item, default=_json_default) + "\n" for item in batch)
+
+def to_csv(items, fields=PUBLIC_USER_ATTRIBUTES, chunk_rows=None):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+
+    def flush():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writeheader()
+    for batch in _batches(items, chunk_rows):
+        writer.writerows(batch)
+        yield flush()
+    # Header only for an empty table
+    if buffer.tell():
+        yield flush()
+
+def export_users(users_table, export_format="ndjson", segments=None):
+    """Chunks of EXPORT_CHUNK_ROWS lines of the users export in `export_format` (ndjson or csv), password left out"""
+    items = scan_users(users_table, segments=segments)
+    if export_format == "csv":
+        return to_csv(items)
+    return to_ndjson(items)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export USERS_TABLE as NDJSON or CSV")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--segments", type=int, default=Config.EXPORT_SEGMENTS)
+    parser.add_argument("--output", help="File to write, stdout when omitted")
+    args = parser.parse_args(argv)
+
+    from src.core.aws import aws
+    users_table = aws.table(Config.USERS_TABLE)
+
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        for line in export_users(users_table, args.format, args.segments):
+            output.write(line)
+    finally:
+        if args.output:
+            output.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import argparse
+import base64
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+from src.core.config import Config
+from src.core.logging import logger
+from src.core.metrics import timed
+from src.services.assets import InvalidCursor, s3_event_records
+from src.services.images import is_source_key, read_metadata
+
+# GALLERY_TABLE layout
+#   album (HASH)     "pictures" / "carousel", the asset prefix without its slash
+#   sort_key (RANGE) "o#<LastModified ISO-8601 UTC>#<object key>" for each object, so a
+#                    descending Query returns an album newest first; "k#<object key>" points
+#                    at the object's current "o#" item (object_sort_key, etag); "count" holds
+#                    the album's item_count and updated_at
+# Object items also carry etag, size, caption (x-amz-meta-caption) and, once the derivative
+# pipeline wrote meta.json, width, height, placeholder and variants.
+# Every change writes the pointer, the object items and the count in one transaction that is
+# conditioned on the pointer as it was read, so concurrent or replayed events for an object
+# can't duplicate its item or skew item_count.
+
+OBJECT_SORT_PREFIX = "o#"
+POINTER_SORT_PREFIX = "k#"
+COUNT_SORT_KEY = "count"
+MAX_WRITE_ATTEMPTS = 3
+
+
+def album_of(key):
+    return next((prefix.rstrip("/") for prefix in Config.ASSET_PREFIXES if key.startswith(prefix)), None)
+
+def pointer_sort_key(key):
+    return f"{POINTER_SORT_PREFIX}{key}"
+
+def object_sort_key(key, last_modified):
+    return f"{OBJECT_SORT_PREFIX}{last_modified.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}#{key}"
+
+def encode_cursor(sort_key):
+    return base64.urlsafe_b64encode(sort_key.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        sort_key = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except Exception:
+        raise InvalidCursor(cursor)
+    if not sort_key.startswith(OBJECT_SORT_PREFIX):
+        raise InvalidCursor(cursor)
+    return sort_key
+
+
+def object_exists(s3, bucket, key):
+    try:
+        s3.head_object(Bucket=bucket, Key=key)
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return False
+        raise
+
+
+class GalleryIndex:
+    """Read and maintain the gallery index of the asset bucket kept in GALLERY_TABLE"""
+
+    def __init__(self, table):
+        self.table = table
+
+    def page(self, album, cursor=None, size=None):
+        """
+        Return (items, next_cursor) for up to `size` objects of `album` after `cursor`, newest first;
+        the whole album when size is None. Raises InvalidCursor for tokens this index did not produce.
+        """
+        from boto3.dynamodb.conditions import Key
+        query_kwargs = {
+            "KeyConditionExpression" : Key("album").eq(album) & Key("sort_key").begins_with(OBJECT_SORT_PREFIX),
+            "ScanIndexForward" : False,
+        }
+        if cursor:
+            query_kwargs["ExclusiveStartKey"] = { "album" : album, "sort_key" : decode_cursor(cursor) }
+
+        items = []
+        while size is None or len(items) <= size:
+            if size is not None:
+                # One extra item tells whether another page exists
+                query_kwargs["Limit"] = size + 1 - len(items)
+            with timed("dynamodb"):
+                response = self.table.query(**query_kwargs)
+            items.extend(response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                break
+            query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+        if size is not None and len(items) > size:
+            items = items[:size]
+            return items, encode_cursor(items[-1]["sort_key"])
+        return items, None
+
+    def summary(self, album):
+        """(number of objects, time of the album's last change) from its count item"""
+        with timed("dynamodb"):
+            item = self.table.get_item(Key={ "album" : album, "sort_key" : COUNT_SORT_KEY }).get("Item", {})
+        updated_at = datetime.fromisoformat(item["updated_at"]) if "updated_at" in item else None
+        return int(item.get("item_count", 0)), updated_at
+
+    def find(self, key):
+        """The pointer item of `key` (object_sort_key, etag), None when it isn't indexed"""
+        pointer_key = { "album" : album_of(key), "sort_key" : pointer_sort_key(key) }
+        return self.table.get_item(Key=pointer_key, ConsistentRead=True).get("Item")
+
+    def upsert(self, s3, bucket, key):
+        """
+        Index the current version of `key`. Replayed and out of order events are no-ops, an
+        overwritten object moves to its new LastModified position. Returns True when the index changed.
+        """
+        album = album_of(key)
+
+        def build(pointer):
+            # Read on every attempt, a concurrent writer may have indexed a newer version
+            try:
+                head = s3.head_object(Bucket=bucket, Key=key)
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                    # Deleted since, its delete event removes it from the index
+                    return None
+                raise
+            etag = head["ETag"].strip('"')
+            sort_key = object_sort_key(key, head["LastModified"])
+            if pointer and pointer["object_sort_key"] == sort_key and pointer["etag"] == etag:
+                return None
+
+            item = {
+                "album" : album,
+                "sort_key" : sort_key,
+                "object_key" : key,
+                "etag" : etag,
+                "size" : head.get("ContentLength", 0),
+                "last_modified" : head["LastModified"].astimezone(timezone.utc).isoformat(),
+            }
+            caption = head.get("Metadata", {}).get("caption")
+            if caption:
+                item["caption"] = caption
+            # The derivatives may have been generated before this event was delivered
+            item.update(self._dimensions(read_metadata(s3, bucket, key), etag))
+
+            pointer_item = { "album" : album, "sort_key" : pointer_sort_key(key), "object_sort_key" : sort_key, "etag" : etag }
+            actions = [
+                { "Put" : { "TableName" : self.table.name, "Item" : pointer_item, **self._unchanged(pointer) } },
+                { "Put" : { "TableName" : self.table.name, "Item" : item } },
+            ]
+            if pointer and pointer["object_sort_key"] != sort_key:
+                actions.append({ "Delete" : { "TableName" : self.table.name, "Key" : { "album" : album, "sort_key" : pointer["object_sort_key"] } } })
+            actions.append(self._touch(album, 0 if pointer else 1))
+            return actions
+
+        return self._transact(key, build)
+
+    def remove(self, s3, bucket, key):
+        """
+        Drop `key` from the index. S3 events arrive unordered, so an object that exists again
+        (re-uploaded after the delete) is left to its ObjectCreated event.
+        """
+        album = album_of(key)
+
+        def build(pointer):
+            # A redelivered delete finds nothing to remove and leaves the count alone
+            if pointer is None or object_exists(s3, bucket, key):
+                return None
+            return [
+                { "Delete" : { "TableName" : self.table.name, "Key" : { "album" : album, "sort_key" : pointer_sort_key(key) }, **self._unchanged(pointer) } },
+                { "Delete" : { "TableName" : self.table.name, "Key" : { "album" : album, "sort_key" : pointer["object_sort_key"] } } },
+                self._touch(album, -1),
+            ]
+
+        return self._transact(key, build)
+
+    def set_metadata(self, key, metadata):
+        """Copy dimensions and variants from the derivative pipeline's meta.json onto the item"""
+        dimensions = self._dimensions(metadata, metadata.get("etag")) if metadata else {}
+        if not dimensions:
+            return False
+        album = album_of(key)
+
+        def build(pointer):
+            # Only the version the derivatives were generated from
+            if pointer is None or pointer["etag"] != metadata["etag"]:
+                return None
+            values = { f":{name}" : value for name, value in dimensions.items() }
+            values[":etag"] = metadata["etag"]
+            return [
+                { "Update" : {
+                    "TableName" : self.table.name,
+                    "Key" : { "album" : album, "sort_key" : pointer["object_sort_key"] },
+                    "UpdateExpression" : "SET " + ", ".join(f"#{name} = :{name}" for name in dimensions),
+                    "ConditionExpression" : "etag = :etag",
+                    "ExpressionAttributeNames" : { f"#{name}" : name for name in dimensions },
+                    "ExpressionAttributeValues" : values,
+                } },
+                self._touch(album, 0),
+            ]
+
+        return self._transact(key, build)
+
+    def _transact(self, key, build):
+        """
+        Write the transaction `build(pointer)` returns for the current pointer of `key`, None
+        meaning there is nothing to change. Rebuilt from a fresh read when a concurrent writer
+        changed the pointer first.
+        """
+        for _ in range(MAX_WRITE_ATTEMPTS):
+            actions = build(self.find(key))
+            if not actions:
+                return False
+            try:
+                self.table.meta.client.transact_write_items(TransactItems=actions)
+                return True
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "TransactionCanceledException":
+                    raise
+        raise RuntimeError(f"Index of {key} changed concurrently {MAX_WRITE_ATTEMPTS} times")
+
+    @staticmethod
+    def _unchanged(pointer):
+        # Condition on the pointer as it was read when the transaction was built
+        if pointer is None:
+            return { "ConditionExpression" : "attribute_not_exists(sort_key)" }
+        return {
+            "ConditionExpression" : "object_sort_key = :pointer_sort_key AND etag = :pointer_etag",
+            "ExpressionAttributeValues" : { ":pointer_sort_key" : pointer["object_sort_key"], ":pointer_etag" : pointer["etag"] },
+        }
+
+    def _touch(self, album, delta):
+        # Every change moves updated_at, which answers If-Modified-Since for the album's pages
+        return { "Update" : {
+            "TableName" : self.table.name,
+            "Key" : { "album" : album, "sort_key" : COUNT_SORT_KEY },
+            "UpdateExpression" : "ADD item_count :delta SET updated_at = :now",
+            "ExpressionAttributeValues" : { ":delta" : delta, ":now" : datetime.now(timezone.utc).isoformat() },
+        } }
+
+    @staticmethod
+    def _dimensions(metadata, etag):
+        if not metadata or metadata.get("etag") != etag:
+            return {}
+        return { name : metadata[name] for name in ("width", "height", "placeholder", "variants") if name in metadata }
+
+
+def get_gallery_index():
+    """The index when GALLERY_TABLE is configured, None to keep serving from the S3 listing"""
+    if not Config.GALLERY_TABLE:
+        return None
+    from src.core.aws import aws
+    return GalleryIndex(aws.table(Config.GALLERY_TABLE))
+
+
+def handle_gallery_event(event, s3=None, index=None):
+    """
+    Entry point for S3 object created/removed notifications on the asset bucket: originals are
+    added, moved or removed, and meta.json files written by the derivative pipeline fill in
+    the dimensions of their original.
+    """
+    index = index or get_gallery_index()
+    if index is None:
+        # Deployed ahead of its table; retrying wouldn't help, the backfill catches up later
+        logger.warning("GALLERY_TABLE is not set, ignoring the gallery event")
+        return { "changed" : 0 }
+
+    from src.core.aws import aws
+    s3 = s3 or aws.client("s3")
+
+    changed = 0
+    failed = []
+    for created, bucket, key, _ in s3_event_records(event):
+        try:
+            if key.startswith(Config.DERIVED_PREFIX) and key.endswith("/meta.json"):
+                source_key = key[len(Config.DERIVED_PREFIX):-len("/meta.json")]
+                if created and index.set_metadata(source_key, read_metadata(s3, bucket, source_key)):
+                    changed += 1
+            elif is_source_key(key):
+                if index.upsert(s3, bucket, key) if created else index.remove(s3, bucket, key):
+                    changed += 1
+        except Exception as e:
+            logger.error(f"Error: {str(e)}, indexing {key}")
+            failed.append(key)
+
+    if failed:
+        # Fail the invocation so Lambda retries the event; the other records are idempotent
+        raise RuntimeError(f"Indexing failed for {', '.join(failed)}")
+    return { "changed" : changed }
+
+def backfill(s3, bucket, index, prefixes=None):
+    """Index every original under `prefixes`, e.g. after creating the table"""
+    indexed = 0
+    paginator = s3.get_paginator("list_objects_v2")
+    for prefix in prefixes or Config.ASSET_PREFIXES:
+        for response in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in response.get("Contents", []):
+                if is_source_key(obj["Key"]) and index.upsert(s3, bucket, obj["Key"]):
+                    indexed += 1
+    return indexed
+
+def create_table(dynamodb, table_name):
+    table = dynamodb.create_table(
+        TableName=table_name,
+        KeySchema=[
+            { "AttributeName" : "album", "KeyType" : "HASH" },
+            { "AttributeName" : "sort_key", "KeyType" : "RANGE" },
+        ],
+        AttributeDefinitions=[
+            { "AttributeName" : "album", "AttributeType" : "S" },
+            { "AttributeName" : "sort_key", "AttributeType" : "S" },
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    table.wait_until_exists()
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the gallery index from the asset bucket")
+    parser.add_argument("--prefix", action="append", help="Source prefix, repeatable (default: ASSET_PREFIXES)")
+    parser.add_argument("--create-table", action="store_true", help="Create GALLERY_TABLE first")
+    args = parser.parse_args(argv)
+
+    if not Config.GALLERY_TABLE:
+        parser.error("GALLERY_TABLE is not set")
+
+    from src.core.aws import aws
+    if args.create_table:
+        create_table(aws.resource("dynamodb"), Config.GALLERY_TABLE)
+    indexed = backfill(aws.client("s3"), Config.AWS_S3_BUCKET_NAME, get_gallery_index(), args.prefix)
+    print(f"Indexed {indexed} objects")
+
+if __name__ == "__main__":
+    main()
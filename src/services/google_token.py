@@ -0,0 +1,93 @@
+import base64
+import json
+import re
+import threading
+import time
+from src.core.config import Config
+from src.core.logging import logger
+from src.core.metrics import timed
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+class GoogleTokenVerifier:
+    """
+    Verifies Google ID tokens locally against a cached copy of Google's signing certificates.
+
+    The certificate set is kept for the max-age Google sends in Cache-Control and fetched over
+    one pooled HTTP session. A token signed with an unknown key id triggers an early refresh,
+    rate limited by `min_refresh_interval`. Passing `certs` pins a static key set (e.g. tests).
+    """
+
+    def __init__(self, client_id=None, certs_url=GOOGLE_CERTS_URL, certs=None, session=None, min_refresh_interval=60, clock_skew_in_seconds=10):
+        self.client_id = client_id or Config.GOOGLE_CLIENT_ID
+        self.certs_url = certs_url
+        self.min_refresh_interval = min_refresh_interval
+        self.clock_skew_in_seconds = clock_skew_in_seconds
+        self._static = certs is not None
+        self._certs = certs or {}
+        self._expires_at = float("inf") if self._static else 0
+        self._fetched_at = 0
+        self._session = session
+        self._lock = threading.Lock()
+
+    def verify(self, token):
+        """Return the verified claims, raises ValueError for invalid tokens"""
+        from google.auth import jwt as google_jwt
+        with timed("google"):
+            certs = self.get_certs(self._key_id(token))
+            claims = google_jwt.decode(
+                token,
+                certs=certs,
+                audience=self.client_id,
+                clock_skew_in_seconds=self.clock_skew_in_seconds
+            )
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer {claims.get('iss')}")
+        return claims
+
+    def get_certs(self, key_id=None):
+        now = time.time()
+        certs = self._certs
+        unknown_key = key_id is not None and key_id not in certs
+        if self._static or (now < self._expires_at and not unknown_key):
+            return certs
+
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            if now < self._expires_at and not (key_id is not None and key_id not in self._certs):
+                return self._certs
+            if now >= self._expires_at or now - self._fetched_at >= self.min_refresh_interval:
+                self._fetch_certs()
+            return self._certs
+
+    def _fetch_certs(self):
+        response = self._get_session().get(self.certs_url, timeout=5)
+        response.raise_for_status()
+        max_age = MAX_AGE_PATTERN.search(response.headers.get("Cache-Control", ""))
+        now = time.time()
+        self._certs = response.json()
+        self._fetched_at = now
+        self._expires_at = now + (int(max_age.group(1)) if max_age else 300)
+        logger.info(f"Fetched {len(self._certs)} google signing certs")
+
+    def _get_session(self):
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4)
+            self._session.mount("https://", adapter)
+        return self._session
+
+    @staticmethod
+    def _key_id(token):
+        try:
+            header = token.split(".")[0]
+            return json.loads(base64.urlsafe_b64decode(header + "=" * (-len(header) % 4))).get("kid")
+        except Exception:
+            raise ValueError("Malformed token header")
+
+
+google_token_verifier = GoogleTokenVerifier()
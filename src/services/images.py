@@ -0,0 +1,215 @@
+import argparse
+import base64
+import io
+import json
+import threading
+import time
+from cachetools import LRUCache, TTLCache
+from src.core.config import Config
+from src.core.logging import logger
+from src.core.metrics import timed
+
+# Derivatives of `pictures/p0.jpg` live next to each other under `derived/pictures/p0.jpg/`:
+# thumb.webp, w<width>.webp for each configured width narrower than the original, and
+# meta.json describing them (written last, so its presence means the set is complete).
+
+DERIVED_CACHE_CONTROL = "public, max-age=86400"
+
+
+def derived_key(source_key, name):
+    return f"{Config.DERIVED_PREFIX}{source_key}/{name}"
+
+def is_source_key(key):
+    return key.startswith(Config.ASSET_PREFIXES) and not key.startswith(Config.DERIVED_PREFIX) and not key.endswith("/")
+
+
+def _encode_webp(image, quality=None):
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=quality or Config.IMAGE_WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+def render_variants(source_bytes):
+    """
+    Decode an original and render its WebP derivatives with Pillow.
+
+    :return: (metadata, {file name: webp bytes}); metadata has the original's width and
+             height, the variants and a tiny blurred LQIP placeholder as a data URI.
+    """
+    from PIL import Image, ImageFilter, ImageOps
+
+    with Image.open(io.BytesIO(source_bytes)) as original:
+        # Camera pictures are often stored sideways with an EXIF orientation
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    width, height = image.size
+    files = {}
+    variants = []
+
+    def add_variant(name, variant):
+        file_name = f"{name}.webp"
+        files[file_name] = _encode_webp(variant)
+        variants.append({ "name" : name, "file" : file_name, "width" : variant.width, "height" : variant.height })
+
+    thumbnail = image.copy()
+    thumbnail.thumbnail((Config.IMAGE_THUMBNAIL_SIZE, Config.IMAGE_THUMBNAIL_SIZE), Image.Resampling.LANCZOS)
+    add_variant("thumb", thumbnail)
+
+    # Never upscale; an original narrower than every width still gets one full-size WebP
+    widths = [target for target in sorted(Config.IMAGE_VARIANT_WIDTHS) if target < width] or [width]
+    for target in widths:
+        resized = image if target == width else image.resize((target, max(1, round(height * target / width))), Image.Resampling.LANCZOS)
+        add_variant(f"w{target}", resized)
+
+    placeholder = image.copy()
+    placeholder.thumbnail((Config.IMAGE_PLACEHOLDER_SIZE, Config.IMAGE_PLACEHOLDER_SIZE), Image.Resampling.BILINEAR)
+    placeholder = placeholder.filter(ImageFilter.GaussianBlur(1))
+    placeholder_uri = "data:image/webp;base64," + base64.b64encode(_encode_webp(placeholder, quality=30)).decode()
+
+    metadata = { "width" : width, "height" : height, "variants" : variants, "placeholder" : placeholder_uri }
+    return metadata, files
+
+
+def read_metadata(s3, bucket, source_key):
+    """The derivatives' meta.json for `source_key`, None when they haven't been generated"""
+    with timed("s3"):
+        try:
+            response = s3.get_object(Bucket=bucket, Key=derived_key(source_key, "meta.json"))
+        except s3.exceptions.NoSuchKey:
+            return None
+        body = response["Body"].read()
+    return json.loads(body)
+
+def process_object(s3, bucket, source_key, etag=None, force=False):
+    """
+    Generate the derivatives of one original and upload them. Skipped when meta.json was
+    already written for the same source ETag, so replayed events and backfills are cheap.
+
+    :return: The metadata written, or None when skipped.
+    """
+    if etag is None:
+        etag = s3.head_object(Bucket=bucket, Key=source_key)["ETag"]
+    etag = etag.strip('"')
+    if not force:
+        existing = read_metadata(s3, bucket, source_key)
+        if existing and existing.get("etag") == etag:
+            return None
+
+    source = s3.get_object(Bucket=bucket, Key=source_key)["Body"].read()
+    metadata, files = render_variants(source)
+    for file_name, body in files.items():
+        s3.put_object(
+            Bucket=bucket, Key=derived_key(source_key, file_name), Body=body,
+            ContentType="image/webp", CacheControl=DERIVED_CACHE_CONTROL
+        )
+
+    metadata = { "source" : source_key, "etag" : etag, **metadata }
+    s3.put_object(
+        Bucket=bucket, Key=derived_key(source_key, "meta.json"),
+        Body=json.dumps(metadata).encode("utf-8"), ContentType="application/json"
+    )
+    logger.info(f"Generated {len(files)} derivatives for {source_key}")
+    return metadata
+
+def delete_derivatives(s3, bucket, source_key):
+    paginator = s3.get_paginator("list_objects_v2")
+    for response in paginator.paginate(Bucket=bucket, Prefix=derived_key(source_key, "")):
+        objects = [{ "Key" : obj["Key"] } for obj in response.get("Contents", [])]
+        if objects:
+            s3.delete_objects(Bucket=bucket, Delete={ "Objects" : objects, "Quiet" : True })
+
+
+def handle_s3_event(event, s3=None):
+    """
+    Entry point for S3 object created/removed notifications on the asset bucket.
+    Objects outside the asset prefixes, including the derivatives themselves, are ignored.
+    """
+    from src.core.aws import aws
+    from src.services.assets import s3_event_records
+    s3 = s3 or aws.client("s3")
+
+    processed = 0
+    failed = []
+    for created, bucket, key, etag in s3_event_records(event):
+        if not is_source_key(key):
+            continue
+        try:
+            if created:
+                process_object(s3, bucket, key, etag=etag)
+            else:
+                delete_derivatives(s3, bucket, key)
+            processed += 1
+        except Exception as e:
+            # Keep going, one unreadable upload shouldn't hold back the rest of the batch
+            logger.error(f"Error: {str(e)}, generating derivatives for {key}")
+            failed.append(key)
+
+    if failed:
+        # Fail the invocation so Lambda retries the event; originals whose derivatives are
+        # current are skipped on the retry
+        raise RuntimeError(f"Generating derivatives failed for {', '.join(failed)}")
+    return { "processed" : processed }
+
+def backfill(s3, bucket, prefixes=None, force=False):
+    """Generate missing or outdated derivatives for every original under `prefixes`"""
+    generated = 0
+    paginator = s3.get_paginator("list_objects_v2")
+    for prefix in prefixes or Config.ASSET_PREFIXES:
+        for response in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in response.get("Contents", []):
+                if is_source_key(obj["Key"]) and process_object(s3, bucket, obj["Key"], etag=obj["ETag"], force=force):
+                    generated += 1
+    return generated
+
+
+class ImageMetadataCache:
+    """
+    meta.json of each original keyed by (bucket, key, source ETag): an overwritten original has
+    a new ETag, so found entries never go stale. Originals without derivatives yet are
+    remembered for a short while only, until the pipeline catches up.
+    """
+
+    def __init__(self, maxsize=None, missing_ttl=None):
+        self._found = LRUCache(maxsize=maxsize or Config.IMAGE_METADATA_CACHE_SIZE)
+        self._missing = TTLCache(maxsize=maxsize or Config.IMAGE_METADATA_CACHE_SIZE, ttl=missing_ttl or Config.ASSET_MANIFEST_TTL, timer=time.time)
+        self._lock = threading.Lock()
+
+    def get(self, s3, bucket, key, etag):
+        cache_key = (bucket, key, (etag or "").strip('"'))
+        with self._lock:
+            if cache_key in self._found:
+                return self._found[cache_key]
+            if cache_key in self._missing:
+                return None
+
+        metadata = read_metadata(s3, bucket, key)
+        with self._lock:
+            if metadata is not None and metadata.get("etag") == cache_key[2]:
+                self._found[cache_key] = metadata
+            else:
+                # Not generated yet, or still describing the previous version of the original
+                metadata = None
+                self._missing[cache_key] = True
+        return metadata
+
+    def clear(self):
+        with self._lock:
+            self._found.clear()
+            self._missing.clear()
+
+
+image_metadata = ImageMetadataCache()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate WebP thumbnails, widths and placeholders for the asset bucket")
+    parser.add_argument("--prefix", action="append", help="Source prefix, repeatable (default: ASSET_PREFIXES)")
+    parser.add_argument("--force", action="store_true", help="Regenerate even when meta.json matches the source ETag")
+    args = parser.parse_args(argv)
+
+    from src.core.aws import aws
+    generated = backfill(aws.client("s3"), Config.AWS_S3_BUCKET_NAME, args.prefix, args.force)
+    print(f"Generated derivatives for {generated} objects")
+
+if __name__ == "__main__":
+    main()
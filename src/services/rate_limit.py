@@ -0,0 +1,87 @@
+import threading
+import time
+from botocore.exceptions import ClientError
+from cachetools import TTLCache
+from fastapi import Depends, HTTPException, Request, status
+from src.common.constants import Constants
+from src.common.dependencies import get_temp_table
+from src.core.config import Config
+from src.core.logging import logger
+from src.db.repository import TtlRepository
+
+
+class RateLimiter:
+    """
+    Allows `limit` hits per key in each `window_seconds` window across all instances.
+
+    The shared count lives in TTL_TABLE as one item per key and window, incremented by a
+    conditional UpdateItem and expired through the table's TTL. Every instance also counts
+    its own hits per window; once that local count reaches the limit (or DynamoDB rejected
+    the key) the window is known to be exhausted and further hits are refused locally.
+    """
+
+    def __init__(self, name, limit, window_seconds=None):
+        self.name = name
+        self.limit = limit
+        self.window_seconds = window_seconds or Config.RATE_LIMIT_WINDOW
+        self._local = TTLCache(maxsize=Config.RATE_LIMIT_LOCAL_CACHE_SIZE, ttl=self.window_seconds)
+        self._lock = threading.Lock()
+
+    async def hit(self, key, table):
+        """Count one hit for `key`, returns False when the key is over the limit"""
+        now = int(time.time())
+        window = now // self.window_seconds
+        local_key = (key, window)
+
+        with self._lock:
+            local_hits = self._local.get(local_key, 0)
+            if local_hits >= self.limit:
+                return False
+            self._local[local_key] = local_hits + 1
+
+        window_end = (window + 1) * self.window_seconds
+        try:
+            await TtlRepository(table).conditional_update(
+                f"ratelimit#{self.name}#{key}#{window}",
+                update_expression = "SET expiration_time = if_not_exists(expiration_time, :exp_time) ADD hits :one",
+                condition_expression = "attribute_not_exists(hits) OR hits < :limit",
+                expression_attribute_values = { ":exp_time" : window_end, ":one" : 1, ":limit" : self.limit }
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                # Other instances used up the window, remember it locally
+                with self._lock:
+                    self._local[local_key] = self.limit
+                return False
+            # Never lock users out because the limiter itself failed
+            logger.info(f"Error: {str(e)}, while rate limiting {self.name}")
+            return True
+
+
+def client_ip(request: Request):
+    # Mangum fills the client from the API Gateway source IP
+    return request.client.host if request.client else "unknown"
+
+
+def too_many_requests():
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=Constants.TOO_MANY_REQUESTS
+    )
+
+
+def rate_limit(name, limit, window_seconds=None, key=client_ip):
+    """
+    Route dependency rejecting requests over the limit with 429, keyed by client IP by default.
+
+        @router.post("/login", dependencies=[Depends(rate_limit("login", 10))])
+    """
+    limiter = RateLimiter(name, limit, window_seconds)
+
+    async def dependency(request: Request, temp_ttl_table = Depends(get_temp_table)):
+        if not await limiter.hit(key(request), temp_ttl_table):
+            raise too_many_requests()
+
+    dependency.limiter = limiter
+    return dependency
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from cachetools import TTLCache
+from src.core.config import Config
+from src.core.logging import logger
+from src.core.metrics import timed
+from src.core.startup import LazyModule
+
+httpx = LazyModule("httpx")
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for `reset_timeout`
+    seconds; after that a single trial call is let through (half-open) to probe recovery.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class TurnstileVerifier:
+    """
+    Async Cloudflare Turnstile verification over a shared keep-alive HTTP client.
+    Tokens are single use: validated tokens are remembered for their 5 minute lifetime so a
+    replay is rejected without another round trip. A circuit breaker stops calling a failing
+    verifier; while it is unavailable `fail_open` decides whether requests pass.
+    """
+
+    def __init__(self, url=None, secret=None, timeout=None, fail_open=None, client=None):
+        self.url = url or Config.TURNSTILE_URL
+        self.secret = secret or Config.TURNSTILE_SECRET_KEY
+        self.timeout = timeout or Config.TURNSTILE_TIMEOUT
+        self.fail_open = (Config.TURNSTILE_FAIL_OPEN == "YES") if fail_open is None else fail_open
+        self.breaker = CircuitBreaker(Config.TURNSTILE_FAILURE_THRESHOLD, Config.TURNSTILE_RESET_TIMEOUT)
+        self._spent = TTLCache(maxsize=Config.TURNSTILE_CACHE_SIZE, ttl=Config.TURNSTILE_CACHE_TTL)
+        self._client = client
+        self._client_loop = None
+
+    async def verify(self, token, remote_ip=None):
+        if token in self._spent:
+            logger.info("Turnstile token replayed")
+            return False
+
+        if not self.breaker.allow():
+            logger.info("Turnstile circuit open, skipping verification")
+            return self.fail_open
+
+        data = { "secret": self.secret, "response": token }
+        if remote_ip:
+            data["remoteip"] = remote_ip
+        try:
+            with timed("turnstile"):
+                client = await self._get_client()
+                response = await client.post(self.url, data=data)
+            response.raise_for_status()  # Raise error for HTTP status >= 400
+            result = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logger.info(f"Error: {str(e)}, verifying turnstile token")
+            self.breaker.record_failure()
+            return self.fail_open
+
+        self.breaker.record_success()
+        if not result.get("success"):
+            return False
+        self._spent[token] = True
+        return True
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._client_loop = None
+
+    async def _get_client(self):
+        # Pooled connections belong to the loop that opened them, rebuild if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._client is None or (self._client_loop is not None and self._client_loop is not loop):
+            if self._client is not None:
+                try:
+                    await self._client.aclose()
+                except Exception as e:
+                    # Its connections may be tied to a loop that is already closed
+                    logger.info(f"Error: {str(e)}, closing turnstile client")
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 1.0)),
+                limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=60),
+            )
+            self._client_loop = loop
+        return self._client
+
+
+turnstile_verifier = TurnstileVerifier()
@@ -1,75 +1,218 @@
-from boto3.dynamodb.conditions import Attr
+import threading
 from botocore.exceptions import ClientError
+from cachetools import TTLCache
 from src.common.methods import internal_server_error
-from src.core.security import verify_password
+from src.core.config import Config
+from src.core.executors import run_sync
+from src.core.security import hash_password_async, password_needs_rehash, verify_password_async
+from src.db.repository import UserRepository
 from src.schemas.user import UserCredentials, UserProfile
 from src.db.models import UserTable
 from src.core.logging import logger
 
-def get_user_data_by_user_id(user_id, users_table):
+
+class UserCache:
+    """
+    Per-process read-through cache of user items, addressable by user_id and user_name.
+    Writes made through this module invalidate or refresh the entries, so changes made by
+    other instances are picked up after at most `ttl` seconds. Only found users are cached.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        maxsize = maxsize or Config.USER_CACHE_SIZE
+        ttl = Config.USER_CACHE_TTL if ttl is None else ttl
+        self._by_id = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._id_by_user_name = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_by_id(self, user_id):
+        with self._lock:
+            return self._count(self._by_id.get(user_id))
+
+    def get_by_user_name(self, user_name):
+        with self._lock:
+            user_id = self._id_by_user_name.get(user_name)
+            return self._count(self._by_id.get(user_id) if user_id else None)
+
+    def put(self, item):
+        with self._lock:
+            self._by_id[item["user_id"]] = dict(item)
+            if item.get("user_name"):
+                self._id_by_user_name[item["user_name"]] = item["user_id"]
+
+    def invalidate(self, user_id):
+        with self._lock:
+            item = self._by_id.pop(user_id, None)
+            if item and self._id_by_user_name.get(item.get("user_name")) == user_id:
+                del self._id_by_user_name[item["user_name"]]
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._id_by_user_name.clear()
+
+    def stats(self):
+        return { "hits" : self.hits, "misses" : self.misses, "size" : len(self._by_id) }
+
+    def _count(self, item):
+        if item is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Callers mutate the item they get back (e.g. dropping the password)
+        return dict(item)
+
+
+user_cache = UserCache()
+
+async def get_user_data_by_user_id_async(user_id, users_table):
+    cached = user_cache.get_by_id(user_id)
+    if cached:
+        return cached
     try:
-        response = users_table.get_item(
-            Key={ "user_id": user_id }
-        )
-        return response["Item"] if response.get('Item') else None
+        user_data = await UserRepository(users_table).get_by_id(user_id)
     except Exception as e:
         logger.info(f"Error: {str(e)}, getting data from dynamoDB")
         internal_server_error()
+    if user_data:
+        user_cache.put(user_data)
+    return user_data
     
-def get_user_data_by_user_name(user_name, users_table):
+async def get_user_data_by_user_name_async(user_name, users_table):
+    cached = user_cache.get_by_user_name(user_name)
+    if cached:
+        return cached
     try:
-        response  = users_table.scan(FilterExpression=Attr('user_name').eq(user_name))
-        return response["Items"][0] if response.get('Items') else None
+        user_data = await UserRepository(users_table).get_by_user_name(user_name)
     except Exception as e:
         logger.info(f"Error: {str(e)}, getting data from dynamoDB")
         internal_server_error()
+    if user_data:
+        user_cache.put(user_data)
+    return user_data
 
-def update_user_profile(user_details : UserProfile, users_table):
+async def get_user_data_by_email_async(email, users_table):
+    # OTP users are registered with their email as user name
+    cached = user_cache.get_by_user_name(email)
+    if cached and cached.get("email") == email:
+        return cached
     try:
-        response = users_table.update_item(
-            Key = { "user_id" : user_details.user_id },
-            UpdateExpression = "SET full_name = :full_name, email = :email, phone_number = :phone_number, picture = :picture",
-            ExpressionAttributeValues = {
-                ":full_name" : user_details.full_name,
-                ":email" : user_details.email,
-                ":phone_number" : user_details.phone_number,
-                ":picture" : user_details.picture
-            }
-        )
-        return True if response.get("ResponseMetadata").get("HTTPStatusCode") == 200 else None
+        user_data = await UserRepository(users_table).get_by_email(email)
+    except Exception as e:
+        logger.info(f"Error: {str(e)}, getting data from dynamoDB")
+        internal_server_error()
+    if user_data:
+        user_cache.put(user_data)
+    return user_data
+
+async def update_user_profile_async(user_details : UserProfile, users_table):
+    try:
+        update_expression = "SET full_name = :full_name, phone_number = :phone_number, picture = :picture"
+        expression_attribute_values = {
+            ":full_name" : user_details.full_name,
+            ":phone_number" : user_details.phone_number,
+            ":picture" : user_details.picture
+        }
+        # email is a GSI key, which DynamoDB does not allow to be an empty string
+        if user_details.email:
+            update_expression += ", email = :email"
+            expression_attribute_values[":email"] = user_details.email
+        else:
+            update_expression += " REMOVE email"
+
+        success = await UserRepository(users_table).update(user_details.user_id, update_expression, expression_attribute_values)
+        user_cache.invalidate(user_details.user_id)
+        return True if success else None
     except ClientError as e:
         logger.info(f"Error: {str(e)}, while updating user in dynamoDB")
         return None
     
-def create_new_user(new_user : UserTable, users_table):
+async def create_new_user_async(new_user : UserTable, users_table):
     try:
-        response = users_table.put_item(
-            Item = {
-                        "user_id" : new_user.user_id,
-                        "full_name" : new_user.full_name or "",
-                        "user_name" : new_user.user_name or "",
-                        "password" : new_user.password or "",
-                        "email" : new_user.email or "",
-                        "phone_number" : new_user.phone_number or "",
-                        "picture" : new_user.picture or "",
-                        "user_type" : new_user.user_type.value or "",
-                        "account_type" : new_user.account_type.value or ""
-                    }
-        )
-        return True if response.get("ResponseMetadata").get("HTTPStatusCode") == 200 else None
+        item = {
+            "user_id" : new_user.user_id,
+            "full_name" : new_user.full_name or "",
+            "user_name" : new_user.user_name or "",
+            "password" : new_user.password or "",
+            "phone_number" : new_user.phone_number or "",
+            "picture" : new_user.picture or "",
+            "user_type" : new_user.user_type.value or "",
+            "account_type" : new_user.account_type.value or ""
+        }
+        # email is a GSI key, which DynamoDB does not allow to be an empty string
+        if new_user.email:
+            item["email"] = new_user.email
+        success = await UserRepository(users_table).create(item)
+        if success:
+            user_cache.put(item)
+        return True if success else None
     except ClientError as e:
         logger.info(f"Error: {str(e)}, while creating new user in dynamoDB")
         return None
-    
-    
-def verify_user(user_credentials : UserCredentials, user_data):
+
+async def update_user_password_async(user_id, hashed_password, users_table):
+    try:
+        success = await UserRepository(users_table).update(user_id, "SET password = :password", { ":password" : hashed_password })
+        user_cache.invalidate(user_id)
+        return True if success else None
+    except ClientError as e:
+        logger.info(f"Error: {str(e)}, while updating password in dynamoDB")
+        return None
+
+async def verify_user_async(user_credentials : UserCredentials, user_data, users_table=None):
+    """
+    Check the credentials against the stored bcrypt hash off the event loop.
+    When `users_table` is given, a hash stored with a cost other than BCRYPT_ROUNDS
+    is replaced after a successful check, so cost changes roll out on next login.
+    """
     try:
-        if user_credentials.user_type.value != user_data["user_type"] or not verify_password(user_credentials.password, user_data["password"]):
+        if user_credentials.user_type.value != user_data["user_type"] or not await verify_password_async(user_credentials.password, user_data["password"]):
             return None
-        return True
     except Exception as e:
         logger.info(f"Error: {str(e)}")
         return None
+
+    if users_table is not None and password_needs_rehash(user_data["password"]):
+        try:
+            hashed_password = await hash_password_async(user_credentials.password)
+            if await update_user_password_async(user_data["user_id"], hashed_password, users_table):
+                user_data["password"] = hashed_password
+        except Exception as e:
+            # A failed upgrade must not fail the login, the old hash stays valid
+            logger.info(f"Error: {str(e)}, while upgrading password hash")
+    return True
+
+async def get_users_by_ids_async(user_ids, users_table):
+    """Users for `user_ids` in the requested order without their password, unknown ids are skipped"""
+    try:
+        users = await UserRepository(users_table).batch_get_by_ids(user_ids)
+    except Exception as e:
+        logger.info(f"Error: {str(e)}, getting users in batch from dynamoDB")
+        internal_server_error()
+    return [users[user_id] for user_id in dict.fromkeys(user_ids) if user_id in users]
+
+# Synchronous entry points for sync routes and scripts, thin wrappers over the async API
+
+def get_user_data_by_user_id(user_id, users_table):
+    return run_sync(get_user_data_by_user_id_async(user_id, users_table))
+
+def get_user_data_by_user_name(user_name, users_table):
+    return run_sync(get_user_data_by_user_name_async(user_name, users_table))
+
+def get_user_data_by_email(email, users_table):
+    return run_sync(get_user_data_by_email_async(email, users_table))
+
+def update_user_profile(user_details : UserProfile, users_table):
+    return run_sync(update_user_profile_async(user_details, users_table))
+
+def create_new_user(new_user : UserTable, users_table):
+    return run_sync(create_new_user_async(new_user, users_table))
+
+    
+def verify_user(user_credentials : UserCredentials, user_data):
+    return run_sync(verify_user_async(user_credentials, user_data))
     
 
 def create_profile(user_details : UserTable):
@@ -83,4 +226,3 @@ def create_profile(user_details : UserTable):
             "user_type" : user_details.user_type.value,
             "account_type" : user_details.account_type.value
         }
-    
\ No newline at end of file
@@ -0,0 +1,11 @@
+import os
+
+# Config is read at import time; give the required settings test values before any src import
+for name, value in {
+    "APP_ENV" : "test",
+    "APP_SECRET" : "test-secret",
+    "JWT_ALGO" : "HS256",
+    "JWT_EXPIRY_MIN" : "30",
+    "TURNSTILE_SECRET_KEY" : "test",
+}.items():
+    os.environ.setdefault(name, value)
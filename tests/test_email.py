@@ -0,0 +1,102 @@
+import asyncio
+import json
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from src.core.config import Config
+from src.services import email
+from src.services.email import EmailOutbox, SmtpConnection, handle_email_event
+
+
+class Recorder:
+    """Local SMTP server that keeps the recipients and rejects "bounce@" addresses"""
+
+    def __init__(self):
+        self.received = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("bounce@"):
+            return "550 mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received.extend(envelope.rcpt_tos)
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+@pytest.fixture
+def smtp():
+    recorder = Recorder()
+    port = free_port()
+    controller = Controller(recorder, hostname="127.0.0.1", port=port)
+    controller.start()
+    connection = SmtpConnection(host="127.0.0.1", port=port, user="", password="", starttls=False)
+    yield recorder, connection
+    connection.close()
+    controller.stop()
+
+
+def sqs_event(*recipients):
+    return { "Records" : [
+        { "messageId" : f"m{i}", "body" : json.dumps({ "to" : to, "subject" : "OTP", "body" : "<p>1234</p>" }) }
+        for i, to in enumerate(recipients)
+    ] }
+
+
+def test_outbox_flush_waits_for_delivery(smtp):
+    recorder, connection = smtp
+    outbox = EmailOutbox(connection, batch_size=2, max_attempts=2, retry_backoff=0)
+    for i in range(5):
+        outbox.enqueue(f"user{i}@example.com", "OTP", "<p>1234</p>")
+
+    assert outbox.flush(timeout=10)
+    assert sorted(recorder.received) == [f"user{i}@example.com" for i in range(5)]
+
+
+def test_outbox_flush_returns_after_failed_message(smtp):
+    recorder, connection = smtp
+    outbox = EmailOutbox(connection, max_attempts=2, retry_backoff=0)
+    outbox.enqueue("bounce@example.com", "OTP", "<p>1234</p>")
+    outbox.enqueue("user@example.com", "OTP", "<p>1234</p>")
+
+    assert outbox.flush(timeout=10)
+    assert recorder.received == ["user@example.com"]
+
+
+def test_email_event_reports_failed_messages(smtp):
+    recorder, connection = smtp
+    result = handle_email_event(sqs_event("a@example.com", "bounce@example.com", "b@example.com"), connection)
+
+    assert result == { "batchItemFailures" : [{ "itemIdentifier" : "m1" }] }
+    assert recorder.received == ["a@example.com", "b@example.com"]
+
+
+def test_email_event_reports_malformed_messages(smtp):
+    recorder, connection = smtp
+    event = sqs_event("a@example.com")
+    event["Records"].append({ "messageId" : "broken", "body" : "not json" })
+
+    assert handle_email_event(event, connection) == { "batchItemFailures" : [{ "itemIdentifier" : "broken" }] }
+    assert recorder.received == ["a@example.com"]
+
+
+def test_queue_email_sends_synchronously_on_lambda(smtp, monkeypatch):
+    recorder, connection = smtp
+    monkeypatch.setattr(Config, "EMAIL_QUEUE_URL", None)
+    monkeypatch.setattr(Config, "AWS_LAMBDA_FUNCTION_NAME", "api")
+    monkeypatch.setattr(email, "smtp_connection", connection)
+
+    assert asyncio.run(email.queue_email("user@example.com", "OTP", "<p>1234</p>"))
+    assert recorder.received == ["user@example.com"]
+
+    with pytest.raises(Exception):
+        asyncio.run(email.queue_email("bounce@example.com", "OTP", "<p>1234</p>"))
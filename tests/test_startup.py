@@ -0,0 +1,17 @@
+from src.core.config import Config
+from src.core.startup import LazyModule, measure_imports
+
+
+def test_cold_start_import_time_within_budget():
+    # Fresh interpreter importing the Lambda entry point, like a cold start
+    _, total = measure_imports("app")
+    assert total <= Config.IMPORT_BUDGET_MS, f"import of app took {total:.1f} ms, budget is {Config.IMPORT_BUDGET_MS} ms"
+
+def test_heavy_dependencies_stay_out_of_the_cold_start():
+    timings, _ = measure_imports("app")
+    for module in ("jwt", "smtplib", "httpx", "bcrypt", "google.oauth2", "boto3", "PIL"):
+        assert module not in timings, f"{module} is imported by app at load time"
+
+def test_lazy_module_imports_on_first_use():
+    json = LazyModule("json")
+    assert json.loads("[1]") == [1]
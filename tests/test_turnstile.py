@@ -0,0 +1,97 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from src.services.turnstile import TurnstileVerifier
+
+
+class StubVerifier(BaseHTTPRequestHandler):
+    """Local stand-in for Cloudflare's siteverify: "good-*" tokens pass, once each"""
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        token = form["response"][0]
+        self.server.requests.append(form)
+        if self.server.status != 200:
+            self.send_response(self.server.status)
+            self.end_headers()
+            return
+        success = token.startswith("good") and token not in self.server.seen
+        self.server.seen.add(token)
+        body = json.dumps({ "success" : success }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubVerifier)
+    server.requests = []
+    server.seen = set()
+    server.status = 200
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_verifier(stub, fail_open=False):
+    verifier = TurnstileVerifier(url=f"http://127.0.0.1:{stub.server_address[1]}/siteverify", secret="test", timeout=2, fail_open=fail_open)
+    verifier.breaker.failure_threshold = 2
+    return verifier
+
+
+def test_valid_token_passes(stub):
+    verifier = make_verifier(stub)
+    assert asyncio.run(verifier.verify("good-1", "10.0.0.1"))
+    assert stub.requests[0]["secret"] == ["test"]
+    assert stub.requests[0]["remoteip"] == ["10.0.0.1"]
+
+def test_invalid_token_fails(stub):
+    assert not asyncio.run(make_verifier(stub).verify("bad-1"))
+
+def test_token_is_single_use(stub):
+    verifier = make_verifier(stub)
+
+    async def verify_twice():
+        return await verifier.verify("good-1"), await verifier.verify("good-1")
+
+    assert asyncio.run(verify_twice()) == (True, False)
+    # The replay is rejected locally, without another siteverify call
+    assert len(stub.requests) == 1
+
+def test_circuit_opens_and_fails_closed(stub):
+    stub.status = 503
+    verifier = make_verifier(stub)
+
+    async def verify_many():
+        return [await verifier.verify(f"good-{index}") for index in range(4)]
+
+    assert asyncio.run(verify_many()) == [False] * 4
+    assert verifier.breaker.is_open
+    # Calls stop once the breaker opened after two failures
+    assert len(stub.requests) == 2
+
+def test_fail_open_policy(stub):
+    stub.status = 503
+    assert asyncio.run(make_verifier(stub, fail_open=True).verify("good-1"))
+
+def test_client_rebuilt_and_old_one_closed_on_new_loop(stub):
+    verifier = make_verifier(stub)
+    assert asyncio.run(verifier.verify("good-1"))
+    first_client = verifier._client
+    assert asyncio.run(verifier.verify("good-2"))
+    assert verifier._client is not first_client
+    assert first_client.is_closed
+    asyncio.run(verifier.aclose())